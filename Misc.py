@@ -71,16 +71,15 @@ if __name__ == "__main__":
 
 """The below code is to monitor the changes to .jpg image file by calculating its hsh has changed or not"""
 import time
-import hashlib
 import os
 from PIL import Image
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
+from digests import DEFAULT_ALGORITHM, hash_file
 
 # Function to calculate the hash of an image
-def calculate_hash(image_path):
-    with open(image_path, 'rb') as f:
-        return hashlib.sha256(f.read()).hexdigest()
+def calculate_hash(image_path, algorithm=DEFAULT_ALGORITHM):
+    return hash_file(image_path, algorithm)[0]
 
 # Function to check if image is modified
 def is_image_modified(image_path, last_hash):
@@ -0,0 +1,174 @@
+"""
+Asynchronous alert dispatch
+1) the event handler only puts alerts on a bounded queue, and never waits on a notification
+2) a dispatcher thread sends the first alert at once, then batches what arrives into summaries ("312 honeypots encrypted in 2.0s")
+3) summaries are rate limited to one per interval, however fast alerts come in
+4) alerts go to pluggable sinks: console, desktop (notify2), log file, syslog and an HTTP webhook, chosen with
+   phase2's ALERT_* settings
+5) alerts that do not fit in the queue are counted and reported with the next summary
+"""
+
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+from collections import Counter, namedtuple
+
+Alert = namedtuple('Alert', 'kind path detail time')
+
+MESSAGES = {
+    'modified': "Image {path} has been modified!",
+    'encrypted': "Image {path} has been encrypted!",
+    'overwritten': "Image {path} has been overwritten!",
+    'moved': "Image {path} has been moved to {detail}!",
+    'premodified': "Image {path} was modified before it was monitored!",
+}
+
+def alert_message(alert):
+    return MESSAGES.get(alert.kind, "Image {path}: {kind}").format(**alert._asdict())
+
+def summarize(alerts, elapsed, dropped=0):
+    """Return one line describing a batch of alerts."""
+    if len(alerts) == 1 and not dropped:
+        return alert_message(alerts[0])
+    kinds = Counter(alert.kind for alert in alerts)
+    parts = ', '.join(f"{count} {kind}" for kind, count in kinds.most_common())
+    summary = f"{len(alerts)} honeypot alerts in {elapsed:.1f}s ({parts})"
+    if dropped:
+        summary += f", {dropped} more dropped"
+    return summary
+
+class ConsoleSink:
+    """Print every alert, as phase2 always has."""
+    def send(self, summary, alerts):
+        for alert in alerts:
+            print(alert_message(alert))
+
+class DesktopSink:
+    """Show one desktop notification per batch."""
+    def __init__(self, app_name="Image Modification Detected"):
+        self.app_name = app_name
+        self.notify2 = None
+        self.disabled = False
+
+    def send(self, summary, alerts):
+        if self.disabled:
+            return
+        if self.notify2 is None:
+            # D-Bus is only needed once there is something to show
+            try:
+                import notify2
+            except ImportError as e:
+                # Warn once rather than on every batch, it will not get installed while we run
+                self.disabled = True
+                logging.warning(f"Desktop notifications disabled: {e}")
+                return
+            notify2.init(self.app_name)
+            self.notify2 = notify2
+        self.notify2.Notification(summary).show()
+
+class LogFileSink:
+    """Append every alert to a log file."""
+    def __init__(self, path='alerts.log'):
+        self.path = path
+
+    def send(self, summary, alerts):
+        with open(self.path, 'a') as f:
+            for alert in alerts:
+                f.write(f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(alert.time))} - {alert_message(alert)}\n")
+
+class SyslogSink:
+    """Send one summary per batch to a syslog socket."""
+    def __init__(self, address='/dev/log'):
+        self.handler = logging.handlers.SysLogHandler(address=address)
+        self.handler.ident = 'honeypot: '
+
+    def send(self, summary, alerts):
+        record = logging.LogRecord('honeypot', logging.WARNING, __file__, 0, summary, None, None)
+        self.handler.emit(record)
+
+class WebhookSink:
+    """POST each batch as JSON to a local HTTP endpoint."""
+    def __init__(self, url, timeout=2.0):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, summary, alerts):
+        import urllib.request
+        body = json.dumps({
+            'summary': summary,
+            'alerts': [alert._asdict() for alert in alerts],
+        }).encode()
+        request = urllib.request.Request(self.url, data=body, headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+def default_sinks():
+    return [ConsoleSink(), DesktopSink()]
+
+class AlertDispatcher:
+    """Deliver alerts to sinks from a thread of its own, in rate-limited batches."""
+    def __init__(self, sinks=None, min_interval=2.0, maxsize=10000):
+        self.sinks = default_sinks() if sinks is None else sinks
+        self.min_interval = min_interval
+        self.queue = queue.Queue(maxsize)
+        self.submitted = 0
+        self.dropped = 0
+        self.batches = 0
+        self.failures = Counter()
+        self.thread = threading.Thread(target=self.run, name="alerts", daemon=True)
+        self.thread.start()
+
+    def submit(self, kind, path, detail=None):
+        """Queue an alert without blocking; returns False if it was dropped."""
+        try:
+            self.queue.put_nowait(Alert(kind, path, detail, time.time()))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.submitted += 1
+        return True
+
+    def run(self):
+        last_sent = float('-inf')
+        reported_drops = 0
+        running = True
+        while running:
+            alert = self.queue.get()
+            if alert is None:
+                return
+            batch = [alert]
+            # The first alert after a quiet interval goes out at once, the rest wait their turn
+            deadline = max(time.monotonic(), last_sent + self.min_interval)
+            while True:
+                timeout = deadline - time.monotonic()
+                try:
+                    alert = self.queue.get(timeout=timeout) if timeout > 0 else self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if alert is None:
+                    running = False
+                    break
+                batch.append(alert)
+            dropped = self.dropped - reported_drops
+            reported_drops += dropped
+            self.dispatch(batch, dropped)
+            last_sent = time.monotonic()
+
+    def dispatch(self, batch, dropped=0):
+        summary = summarize(batch, batch[-1].time - batch[0].time, dropped)
+        self.batches += 1
+        for sink in self.sinks:
+            try:
+                sink.send(summary, batch)
+            except Exception as e:
+                # A broken sink must not stop the others
+                self.failures[type(sink).__name__] += 1
+                logging.warning(f"Alert sink {type(sink).__name__} failed: {e}")
+
+    def close(self):
+        """Send what is queued and stop the thread."""
+        self.queue.put(None)
+        self.thread.join()
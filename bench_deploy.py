@@ -0,0 +1,60 @@
+"""
+Micro-benchmark for honeypot deployment
+1) draws and encodes a new PIL image per honeypot, as phase1 used to
+2) copies pre-rendered templates from a TemplateCache
+3) prints deployments per second for both
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from PIL import Image, ImageDraw
+from templates import TemplateCache
+
+def create_image_with_pil(file_path):
+    """The per-honeypot rendering phase1 used before the template cache."""
+    width, height = 200, 200
+    image = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(image)
+    draw.text((10, 10), "This is a secure image", fill="black")
+    image.save(file_path)
+
+def deployments_per_second(deploy, directory, count):
+    start = time.perf_counter()
+    for i in range(count):
+        deploy(os.path.join(directory, f"honeypot_{i}_hpot.jpg"))
+    return count / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=5000)
+    parser.add_argument('--dir', default=None, help="directory to deploy into (default: a temporary directory)")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='bench_deploy_', dir=args.dir)
+    try:
+        pil_dir = os.path.join(work_dir, 'pil')
+        template_dir = os.path.join(work_dir, 'templates')
+        cache_dir = os.path.join(work_dir, 'cache')
+        os.mkdir(pil_dir)
+        os.mkdir(cache_dir)
+
+        pil_rate = deployments_per_second(create_image_with_pil, pil_dir, args.count)
+        start = time.perf_counter()
+        cache = TemplateCache(template_dir)
+        startup = time.perf_counter() - start
+        cache_rate = deployments_per_second(cache.deploy, cache_dir, args.count)
+        method = 'reflink' if cache.can_clone else 'copy_file_range' if cache.can_copy_range else 'write'
+        cache.close()
+
+        print(f"{'deployment':<32}{'per second':>12}{'speedup':>10}")
+        print(f"{'PIL render per honeypot':<32}{pil_rate:>12.0f}{1:>10.1f}")
+        print(f"{'template cache (' + method + ')':<32}{cache_rate:>12.0f}{cache_rate / pil_rate:>10.1f}")
+        print(f"template pool rendered in {startup * 1000:.1f} ms")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+End-to-end detection latency benchmark
+1) builds a synthetic directory tree and deploys a honeypot in every directory with phase1.create_honeypot
+2) arms phase2 in-process from the registry, with an alert sink that records when alerts arrive
+3) encrypts the tree with en.encrypt_images_in_directory at a controlled rate
+4) reports p50/p99 time from the first encryption to the first alert, and how many honeypots were encrypted before it, as JSON
+   (an encryption is timed by the mtime of the file, so latencies are only as fine as the filesystem clock)
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from dirwatch import DirectoryWatcher
+import en
+import phase1
+import phase2
+from alerts import AlertDispatcher
+from registry import HoneypotRegistry
+
+PASSWORD = "BenchmarkPassword"
+
+class RecordingSink:
+    """Alert sink that keeps the arrival time of every alert."""
+    def __init__(self):
+        self.times = []
+        self.paths = set()
+        self.first = threading.Event()
+
+    def send(self, summary, alerts):
+        # Wall clock, to compare with the mtime of the encrypted files
+        now = time.time_ns()
+        for alert in alerts:
+            self.times.append(now)
+            self.paths.add(alert.path)
+        self.first.set()
+
+def build_tree(root, directories, fanout):
+    """Create `directories` directories, `fanout` per parent, breadth first."""
+    paths = []
+    parents = [root]
+    while len(paths) < directories:
+        children = []
+        for parent in parents:
+            for i in range(fanout):
+                if len(paths) == directories:
+                    break
+                path = os.path.join(parent, f"d{i}")
+                os.mkdir(path)
+                paths.append(path)
+                children.append(path)
+        parents = children
+    return paths
+
+def deploy(directories):
+    """Deploy honeypots through phase1 into a fresh registry in the working directory."""
+    phase1.registry = None
+    for directory in directories:
+        phase1.create_honeypot(directory)
+    phase1.flush_registry()
+    phase1.registry.close()
+    phase1.registry = None
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non-empty list."""
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, round(fraction * len(values) + 0.5) - 1))]
+
+def run_once(base, directories, fanout, rate, timeout):
+    root = tempfile.mkdtemp(dir=base)
+    cwd = os.getcwd()
+    os.chdir(root)
+    try:
+        tree = os.path.join(root, 'tree')
+        os.mkdir(tree)
+        deploy(build_tree(tree, directories, fanout))
+
+        registry = HoneypotRegistry()
+        sink = RecordingSink()
+        dispatcher = AlertDispatcher([sink])
+        handler = phase2.ImageChangeHandler([], [], alerts=dispatcher)
+        watcher = DirectoryWatcher(handler)
+        watch_manager = phase2.WatchManager(watcher)
+        for row in registry.honeypots():
+            handler.add_image(row['path'], *phase2.registry_baseline(row))
+            watch_manager.add(row['path'])
+        registry.close()
+        watcher.start()
+
+        # The alert can arrive before encrypt_image() returns, so a file counts
+        # as encrypted from the mtime of its last write
+        encrypted_paths = []
+        encrypt_image = en.encrypt_image
+        def recorded_encrypt_image(path, password):
+            encrypt_image(path, password)
+            encrypted_paths.append(path)
+        en.encrypt_image = recorded_encrypt_image
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                en.encrypt_images_in_directory(tree, PASSWORD, 1 / rate if rate else 0)
+                sink.first.wait(timeout)
+                # Give the last files time to be reported, for the coverage figure
+                time.sleep(2 * phase2.QUIET_WINDOW + dispatcher.min_interval)
+        finally:
+            en.encrypt_image = encrypt_image
+        watcher.stop()
+        watcher.join()
+        handler.close()
+        encrypted = sorted(os.stat(path).st_mtime_ns for path in encrypted_paths)
+
+        if not sink.times:
+            return {'honeypots': len(handler), 'encrypted': len(encrypted), 'detected': False}
+        first_alert = min(sink.times)
+        return {
+            'honeypots': len(handler),
+            'encrypted': len(encrypted),
+            'detected': True,
+            'latency_ms': (first_alert - encrypted[0]) / 1e6,
+            'encrypted_before_detection': sum(1 for t in encrypted if t <= first_alert),
+            'alerted': len(sink.paths),
+        }
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(root, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--directories', type=int, default=100, help="directories (and honeypots) in the tree")
+    parser.add_argument('--fanout', type=int, default=10, help="subdirectories per directory")
+    parser.add_argument('--rate', type=float, default=0, help="files encrypted per second, 0 for as fast as en.py goes")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--timeout', type=float, default=30, help="seconds to wait for the first alert")
+    parser.add_argument('--base', default=None, help="directory to build the trees in (default: system temp)")
+    parser.add_argument('--output', default=None, help="also write the JSON result to this file")
+    args = parser.parse_args()
+
+    runs = [run_once(args.base, args.directories, args.fanout, args.rate, args.timeout) for _ in range(args.runs)]
+    detected = [run for run in runs if run['detected']]
+    summary = {'detected_runs': len(detected)}
+    for key in ('latency_ms', 'encrypted_before_detection'):
+        for name, fraction in (('p50', 0.5), ('p99', 0.99)):
+            summary[f"{key}_{name}"] = percentile([run[key] for run in detected], fraction) if detected else None
+    result = {'config': vars(args), 'runs': runs, 'summary': summary}
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+
+if __name__ == "__main__":
+    main()
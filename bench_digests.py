@@ -0,0 +1,38 @@
+"""
+Benchmark for the honeypot digest algorithms
+1) hashes in-memory buffers of honeypot-like sizes with every available algorithm
+2) prints throughput in GB/s, so the default algorithm can be chosen on real numbers
+"""
+
+import argparse
+import os
+import time
+from digests import DEFAULT_ALGORITHM, available_algorithms, hash_bytes
+
+def throughput(algorithm, data, min_seconds):
+    """Return GB/s for hashing `data` repeatedly for at least `min_seconds`."""
+    rounds = 0
+    start = time.perf_counter()
+    while True:
+        hash_bytes(data, algorithm)
+        rounds += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds:
+            return rounds * len(data) / elapsed / 1e9
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    # A rendered honeypot template is about 2 KB; larger sizes show the streaming rate
+    parser.add_argument('--sizes', type=int, nargs='+', default=[2 * 1024, 64 * 1024, 1024 * 1024, 16 * 1024 * 1024])
+    parser.add_argument('--seconds', type=float, default=0.5, help="minimum time per measurement")
+    args = parser.parse_args()
+
+    algorithms = available_algorithms()
+    print(f"default algorithm: {DEFAULT_ALGORITHM}")
+    print(f"{'bytes':>10}" + ''.join(f"{algorithm:>12}" for algorithm in algorithms) + "   (GB/s)")
+    for size in args.sizes:
+        data = os.urandom(size)
+        print(f"{size:>10}" + ''.join(f"{throughput(algorithm, data, args.seconds):>12.2f}" for algorithm in algorithms))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Benchmark for phase2 event dispatch
+1) builds an ImageChangeHandler with n honeypots (no files are read)
+2) dispatches modified events for files that are not honeypots, the common case during an attack
+3) compares the cost per event with the zip/list.index loop phase2 used before
+"""
+
+import argparse
+import os
+import time
+from watchdog.events import FileModifiedEvent
+from phase2 import ImageChangeHandler
+
+def legacy_dispatch(image_paths, last_hashes, event):
+    """The O(n) lookup phase2 used before the handler was rebuilt on dictionaries."""
+    for image_path, last_hash in zip(image_paths, last_hashes):
+        if event.src_path == image_path:
+            return image_paths.index(image_path)
+    return None
+
+def per_event_us(func, events):
+    start = time.perf_counter()
+    for event in events:
+        func(event)
+    return (time.perf_counter() - start) / len(events) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--events', type=int, default=2000)
+    args = parser.parse_args()
+
+    base = os.path.abspath('bench_dispatch_tree')
+    print(f"{'honeypots':>10}{'legacy us/event':>18}{'dict us/event':>16}{'speedup':>10}")
+    for size in args.sizes:
+        image_paths = [os.path.join(base, f"d{i}", "funny_robot_hpot.jpg") for i in range(size)]
+        last_hashes = ['0' * 64] * size
+        handler = ImageChangeHandler(image_paths, [(last_hash, None, None) for last_hash in last_hashes])
+        events = [FileModifiedEvent(os.path.join(base, f"d{i % size}", f"document_{i}.docx"))
+                  for i in range(args.events)]
+        legacy = per_event_us(lambda event: legacy_dispatch(image_paths, last_hashes, event), events)
+        current = per_event_us(handler.on_modified, events)
+        print(f"{size:>10}{legacy:>18.2f}{current:>16.2f}{legacy / current:>10.0f}")
+
+if __name__ == "__main__":
+    main()
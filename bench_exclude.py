@@ -0,0 +1,114 @@
+"""
+Benchmark for the phase1 exclusion rules
+1) builds a synthetic developer home directory: projects with a small source tree next to a .git object store,
+   a node_modules tree, build outputs and caches, plus a ~/.cache (on tmpfs when /dev/shm is available)
+2) scans it with the os.walk scanner and the incremental scanner, with no rules and with matcher.DEFAULT_EXCLUDES
+3) reports the cold scan and a no-change tick, the directories listed and the entries kept; the directories are also
+   the honeypots phase1 would deploy and the watches a per-directory watcher would need
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from matcher import PathMatcher, DEFAULT_EXCLUDES
+from phase1 import get_directory_structure
+from snapshot import IncrementalScanner
+from bench_scan import age_tree
+
+def make_files(directory, count, prefix='f', extension='.txt'):
+    os.makedirs(directory, exist_ok=True)
+    for i in range(count):
+        open(os.path.join(directory, f"{prefix}{i}{extension}"), 'w').close()
+
+def build_project(root_dir, source_directories, packages):
+    """A project: source directories, a .git object store, node_modules, build outputs and a __pycache__."""
+    for i in range(source_directories):
+        make_files(os.path.join(root_dir, 'src', f"module{i}"), 5, extension='.py')
+    make_files(os.path.join(root_dir, 'src', '__pycache__'), source_directories, extension='.pyc')
+    # git fans loose objects out over 256 directories
+    for i in range(256):
+        make_files(os.path.join(root_dir, '.git', 'objects', f"{i:02x}"), 2, extension='')
+    make_files(os.path.join(root_dir, '.git', 'refs', 'heads'), 3, extension='')
+    # Each package brings its own lib/ and a nested node_modules of dependencies
+    for i in range(packages):
+        package = os.path.join(root_dir, 'node_modules', f"package{i}")
+        make_files(os.path.join(package, 'lib'), 8, extension='.js')
+        make_files(os.path.join(package, 'node_modules', f"dependency{i}", 'dist'), 4, extension='.js')
+    for output in ('build', 'dist'):
+        for i in range(source_directories):
+            make_files(os.path.join(root_dir, output, f"module{i}"), 5, extension='.o')
+
+def build_home(root_dir, projects, source_directories, packages, cache_directories):
+    for i in range(projects):
+        build_project(os.path.join(root_dir, 'projects', f"project{i}"), source_directories, packages)
+    for i in range(source_directories):
+        make_files(os.path.join(root_dir, 'Documents', f"folder{i}"), 5, extension='.pdf')
+    for i in range(cache_directories):
+        make_files(os.path.join(root_dir, '.cache', 'pip', f"{i:03x}"), 4, extension='')
+
+def measure_walk(root_dir, matcher, ticks):
+    """The os.walk scanner: every tick lists every directory again."""
+    start = time.perf_counter()
+    structure = get_directory_structure(root_dir, matcher)
+    cold = time.perf_counter() - start
+    samples = []
+    for _ in range(ticks):
+        start = time.perf_counter()
+        get_directory_structure(root_dir, matcher)
+        samples.append(time.perf_counter() - start)
+    entries = sum(len(data['directories']) + len(data['files']) for data in structure.values())
+    return cold, statistics.median(samples), len(structure), entries
+
+def measure_incremental(root_dir, matcher, ticks):
+    """The incremental scanner: a tick re-lists only directories whose mtime changed."""
+    scanner = IncrementalScanner(root_dir, matcher)
+    start = time.perf_counter()
+    snapshot = scanner.scan()
+    cold = time.perf_counter() - start
+    listed = scanner.listed
+    samples = []
+    for _ in range(ticks):
+        start = time.perf_counter()
+        scanner.scan()
+        samples.append(time.perf_counter() - start)
+    return cold, statistics.median(samples), listed, len(snapshot) - 1
+
+SCANNERS = {
+    'walk': measure_walk,
+    'incremental': measure_incremental,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--projects', type=int, default=10)
+    parser.add_argument('--source-directories', type=int, default=20, help="source directories per project")
+    parser.add_argument('--packages', type=int, default=200, help="node_modules packages per project")
+    parser.add_argument('--cache-directories', type=int, default=1000)
+    parser.add_argument('--ticks', type=int, default=3, help="no-change ticks, the median is reported")
+    parser.add_argument('--scanners', nargs='+', default=list(SCANNERS), choices=list(SCANNERS))
+    parser.add_argument('--exclude', nargs='+', default=DEFAULT_EXCLUDES, help="glob rules for the excluding run")
+    parser.add_argument('--base', default='/dev/shm' if os.path.isdir('/dev/shm') else None)
+    args = parser.parse_args()
+
+    root_dir = tempfile.mkdtemp(prefix='bench_exclude_', dir=args.base)
+    try:
+        build_home(root_dir, args.projects, args.source_directories, args.packages, args.cache_directories)
+        age_tree(root_dir)
+        header = f"{'scanner':<13}{'rules':<10}{'cold ms':>10}{'tick ms':>10}{'dirs':>9}{'entries':>10}{'speedup':>9}"
+        print(header)
+        print('-' * len(header))
+        for name in args.scanners:
+            baseline = None
+            for rules, matcher in (('none', None), ('exclude', PathMatcher(exclude=args.exclude))):
+                cold, tick, directories, entries = SCANNERS[name](root_dir, matcher, args.ticks)
+                baseline = baseline or cold
+                print(f"{name:<13}{rules:<10}{cold * 1e3:>10.1f}{tick * 1e3:>10.1f}{directories:>9}{entries:>10}"
+                      f"{baseline / cold:>8.1f}x")
+    finally:
+        shutil.rmtree(root_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
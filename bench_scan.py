@@ -0,0 +1,277 @@
+"""
+Benchmark harness for the phase1 scanner
+1) builds synthetic trees of 10k to 1M entries with configurable fan-out and files per directory (on tmpfs when /dev/shm is available)
+2) runs every scanner implementation in a child process of its own, so peak RSS is measured per scanner
+3) times each tick (scan + diff) for three workloads: no changes, sparse changes and a burst of changes
+4) reports wall time, CPU time, diff cost and peak RSS side by side in one comparison table
+5) scanners are pluggable: name a built-in one or pass module:Class with scan() and diff(old, new)
+6) --latency adds a delay to every directory listing and stat, to stand in for an NFS/CIFS mount's round trips
+"""
+
+import argparse
+import contextlib
+import importlib
+import multiprocessing
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from phase1 import get_directory_structure, compare_directory_structure
+from snapshot import IncrementalScanner, ParallelScanner, diff_snapshots
+
+try:
+    import resource
+except ImportError:
+    # Windows
+    resource = None
+
+class WalkScanner:
+    """phase1's original scanner: get_directory_structure() + compare_directory_structure()."""
+    def __init__(self, root_dir):
+        self.root_dir = root_dir
+
+    def scan(self):
+        return get_directory_structure(self.root_dir)
+
+    def diff(self, old, new):
+        return compare_directory_structure(old, new)
+
+class IncrementalScan:
+    """The compact snapshot scanner, which re-lists only directories whose mtime changed."""
+    def __init__(self, root_dir):
+        self.scanner = IncrementalScanner(root_dir)
+
+    def scan(self):
+        return self.scanner.scan()
+
+    def diff(self, old, new):
+        return diff_snapshots(old, new)
+
+class ParallelScan(IncrementalScan):
+    """The compact snapshot scanner with directories listed on a thread pool."""
+    def __init__(self, root_dir, workers):
+        self.scanner = ParallelScanner(root_dir, workers=workers)
+
+def parallel_scan(workers):
+    return lambda root_dir: ParallelScan(root_dir, workers)
+
+SCANNERS = {
+    'walk': WalkScanner,
+    'incremental': IncrementalScan,
+}
+SCANNERS.update({f"parallel{workers}": parallel_scan(workers) for workers in (2, 4, 8, 16, 32)})
+
+WORKLOADS = ('none', 'sparse', 'burst')
+
+def load_scanner(name):
+    """Return a scanner class by built-in name or as module:Class."""
+    if name in SCANNERS:
+        return SCANNERS[name]
+    module_name, _, class_name = name.partition(':')
+    if not class_name:
+        raise ValueError(f"Unknown scanner {name!r}, use one of {sorted(SCANNERS)} or module:Class")
+    return getattr(importlib.import_module(module_name), class_name)
+
+def build_tree(root_dir, directories, fanout, files_per_directory):
+    """Create `directories` directories breadth-first, each holding a few empty files; return the depth."""
+    created = 0
+    depth = 0
+    pending = [(root_dir, 0)]
+    head = 0
+    while head < len(pending) and created < directories:
+        parent, level = pending[head]
+        head += 1
+        for i in range(fanout):
+            if created >= directories:
+                break
+            path = os.path.join(parent, f"d{i}")
+            os.mkdir(path)
+            for j in range(files_per_directory):
+                open(os.path.join(path, f"f{j}.txt"), 'w').close()
+            pending.append((path, level + 1))
+            depth = max(depth, level + 1)
+            created += 1
+    return depth
+
+def age_tree(root_dir, seconds=60):
+    """Move every directory's mtime into the past, out of the scanner's racy window."""
+    old = time.time() - seconds
+    for dirpath, dirnames, filenames in os.walk(root_dir):
+        os.utime(dirpath, (old, old))
+    return old
+
+def sample_directories(root_dir, count):
+    """Return `count` directories spread over the tree."""
+    directories = [dirpath for dirpath, dirnames, filenames in os.walk(root_dir)]
+    step = max(1, len(directories) // max(count, 1))
+    return directories[::step][:count]
+
+def apply_workload(directories, workload, files):
+    """Change the tree and return the paths to remove afterwards."""
+    created = []
+    if workload == 'sparse':
+        # One new file in each of a few directories
+        for directory in directories:
+            path = os.path.join(directory, 'bench_new.txt')
+            open(path, 'w').close()
+            created.append(path)
+    elif workload == 'burst':
+        # A new subdirectory full of files in each directory, like an extracted archive
+        for directory in directories:
+            path = os.path.join(directory, 'bench_burst')
+            os.mkdir(path)
+            for j in range(files):
+                open(os.path.join(path, f"f{j}.txt"), 'w').close()
+            created.append(path)
+    return created
+
+def undo_workload(created, directories, mtime):
+    for path in created:
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+    for directory in directories:
+        os.utime(directory, (mtime, mtime))
+
+def peak_rss():
+    """Peak resident set size of this process in bytes, or None."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS bytes
+    return peak if os.uname().sysname == 'Darwin' else peak * 1024
+
+@contextlib.contextmanager
+def simulated_latency(seconds):
+    """Make every os.scandir and os.stat call in this process wait `seconds` first, like a network round trip."""
+    if not seconds:
+        yield
+        return
+    def delayed(call):
+        def wrapper(*args, **kwargs):
+            # Sleeping releases the GIL, as a blocking network call does
+            time.sleep(seconds)
+            return call(*args, **kwargs)
+        return wrapper
+    real_scandir, real_stat = os.scandir, os.stat
+    os.scandir, os.stat = delayed(real_scandir), delayed(real_stat)
+    try:
+        yield
+    finally:
+        os.scandir, os.stat = real_scandir, real_stat
+
+def tick(scanner, previous):
+    """Scan and diff once; return (wall, cpu, diff seconds, changes, snapshot)."""
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    current = scanner.scan()
+    diff_start = time.perf_counter()
+    changes = scanner.diff(previous, current)
+    end = time.perf_counter()
+    return end - wall, time.process_time() - cpu, end - diff_start, len(changes), current
+
+def measure(scanner_name, root_dir, mtime, workloads, changed, files, ticks, latency=0):
+    """Run in a child process: measure every workload with one scanner."""
+    scanner = load_scanner(scanner_name)(root_dir)
+    rss_start = peak_rss()
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    with simulated_latency(latency):
+        snapshot = scanner.scan()
+    results = {'cold': {'wall': time.perf_counter() - wall, 'cpu': time.process_time() - cpu}}
+    directories = sample_directories(root_dir, changed)
+    for workload in workloads:
+        samples = []
+        for _ in range(ticks):
+            created = apply_workload(directories, workload, files)
+            # Only the scans are slowed down, not building and undoing the workloads
+            with simulated_latency(latency):
+                samples.append(tick(scanner, snapshot)[:4])
+            undo_workload(created, directories, mtime)
+            # Resynchronise outside the timed tick. The incremental scanners keep their last snapshot, so drop
+            # this one first, as phase1 does, or three snapshots would be alive where phase1 has two
+            snapshot = None
+            snapshot = scanner.scan()
+        results[workload] = {
+            'wall': statistics.median(sample[0] for sample in samples),
+            'cpu': statistics.median(sample[1] for sample in samples),
+            'diff': statistics.median(sample[2] for sample in samples),
+            'changes': samples[-1][3],
+        }
+    rss_end = peak_rss()
+    results['peak_rss'] = rss_end
+    results['rss_growth'] = rss_end - rss_start if rss_end is not None else None
+    return results
+
+def run_child(connection, *args):
+    try:
+        connection.send(measure(*args))
+    except Exception as e:
+        connection.send({'error': f"{type(e).__name__}: {e}"})
+    finally:
+        connection.close()
+
+def measure_in_child(*args):
+    context = multiprocessing.get_context('fork' if hasattr(os, 'fork') else 'spawn')
+    parent, child = context.Pipe(duplex=False)
+    process = context.Process(target=run_child, args=(child, *args))
+    process.start()
+    child.close()
+    result = parent.recv()
+    process.join()
+    return result
+
+def mb(value):
+    return f"{value / 2**20:.1f}" if value is not None else "-"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000],
+                        help="entries (directories + files) per tree")
+    parser.add_argument('--shapes', nargs='+', default=['10:4', '3:4'],
+                        help="fanout:files per directory, e.g. 10:4 (wide, shallow) or 2:4 (deep)")
+    parser.add_argument('--scanners', nargs='+', default=['walk', 'incremental'],
+                        help=f"built-in {sorted(SCANNERS)} or module:Class")
+    parser.add_argument('--workloads', nargs='+', default=list(WORKLOADS), choices=WORKLOADS)
+    parser.add_argument('--changed', type=int, default=10, help="directories changed by the sparse and burst workloads")
+    parser.add_argument('--burst-files', type=int, default=100, help="files per new directory in the burst workload")
+    parser.add_argument('--ticks', type=int, default=3, help="ticks per workload, the median is reported")
+    parser.add_argument('--latency', type=float, default=0, help="milliseconds added to every listing and stat")
+    parser.add_argument('--base', default='/dev/shm' if os.path.isdir('/dev/shm') else None)
+    args = parser.parse_args()
+
+    header = (f"{'entries':>9}{'shape':>7}{'depth':>6}  {'scanner':<14}{'workload':<9}{'wall ms':>10}{'cpu ms':>10}"
+              f"{'diff ms':>10}{'changes':>9}{'speedup':>9}{'peak MB':>9}{'+MB':>8}")
+    print(header)
+    print('-' * len(header))
+    for size in args.sizes:
+        for shape in args.shapes:
+            fanout, files = (int(value) for value in shape.split(':'))
+            root_dir = tempfile.mkdtemp(prefix='bench_scan_', dir=args.base)
+            try:
+                depth = build_tree(root_dir, size // (files + 1), fanout, files)
+                mtime = age_tree(root_dir)
+                results = {name: measure_in_child(name, root_dir, mtime, args.workloads, args.changed,
+                                                  args.burst_files, args.ticks, args.latency / 1e3)
+                           for name in args.scanners}
+                reference = results[args.scanners[0]]
+                for name, result in results.items():
+                    if 'error' in result:
+                        print(f"{size:>9}{shape:>7}{depth:>6}  {name:<14}{result['error']}")
+                        continue
+                    rows = [('cold', result['cold'])] + [(workload, result[workload]) for workload in args.workloads]
+                    for workload, row in rows:
+                        base_wall = reference.get(workload, {}).get('wall')
+                        speedup = f"{base_wall / row['wall']:.1f}x" if base_wall else "-"
+                        print(f"{size:>9}{shape:>7}{depth:>6}  {name:<14}{workload:<9}{row['wall'] * 1e3:>10.1f}"
+                              f"{row.get('cpu', 0) * 1e3:>10.1f}{row.get('diff', 0) * 1e3:>10.1f}"
+                              f"{row.get('changes', ''):>9}{speedup:>9}"
+                              f"{mb(result['peak_rss']) if workload == 'cold' else '':>9}"
+                              f"{mb(result['rss_growth']) if workload == 'cold' else '':>8}")
+            finally:
+                shutil.rmtree(root_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
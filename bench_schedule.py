@@ -0,0 +1,127 @@
+"""
+Benchmark for the adaptive scan scheduler
+1) builds a tree of many subtrees (on tmpfs when /dev/shm is available); a few are hot and get a new file every few
+   seconds, the rest are cold archives that change only now and then
+2) replays the same timeline of changes against phase1's old fixed 5 second tick and against scheduler.ScanScheduler,
+   on a simulated clock, so minutes of monitoring take seconds to run
+3) reports how long each change took to be detected, for hot and cold subtrees, and how much scanning was done:
+   ticks, directories stat'ed and the time spent scanning
+"""
+
+import argparse
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from scheduler import ScanScheduler
+from snapshot import IncrementalScanner, Created, diff_snapshots
+from bench_scan import build_tree, age_tree
+
+FIXED_INTERVAL = 5.0
+
+def build_subtrees(root_dir, areas, subtrees, directories, files):
+    """Create areas * subtrees subtrees of `directories` directories each; return their paths relative to root_dir."""
+    paths = []
+    for i in range(areas):
+        for j in range(subtrees):
+            path = os.path.join(f"area{i}", f"subtree{j}")
+            os.makedirs(os.path.join(root_dir, path))
+            build_tree(os.path.join(root_dir, path), directories, 4, files)
+            paths.append(path)
+    return paths
+
+def make_timeline(subtrees, hot, hot_period, cold_period, duration, seed):
+    """Return (time, subtree, is_hot) changes, sorted by time."""
+    rng = random.Random(seed)
+    changes = []
+    for subtree in subtrees[:hot]:
+        t = rng.uniform(0, hot_period)
+        while t < duration:
+            changes.append((t, subtree, True))
+            t += rng.expovariate(1 / hot_period)
+    t = rng.expovariate(1 / cold_period)
+    while t < duration:
+        changes.append((t, rng.choice(subtrees[hot:]), False))
+        t += rng.expovariate(1 / cold_period)
+    return sorted(changes)
+
+def simulate(root_dir, timeline, duration, adaptive, budget):
+    scanner = IncrementalScanner(root_dir)
+    scheduler = ScanScheduler(budget=budget) if adaptive else None
+    if adaptive:
+        scanner.subtree_depth = scheduler.depth
+    snapshot = scanner.scan()
+    clock = 0.0
+    next_change = 0
+    waiting = {}
+    latencies = {True: [], False: []}
+    ticks = directories = 0
+    scanning = 0.0
+    while clock < duration:
+        # Everything due by now happens before this tick
+        while next_change < len(timeline) and timeline[next_change][0] <= clock:
+            at, subtree, hot = timeline[next_change]
+            path = os.path.join(subtree, f"change{next_change}.txt")
+            open(os.path.join(root_dir, path), 'w').close()
+            waiting[path] = (at, hot)
+            next_change += 1
+        started = time.perf_counter()
+        current = scanner.scan(scheduler.trusted(clock) if adaptive else ())
+        events = diff_snapshots(snapshot, current)
+        elapsed = time.perf_counter() - started
+        if adaptive:
+            scheduler.record(scanner, events, elapsed, clock)
+        snapshot = current
+        ticks += 1
+        directories += scanner.listed + scanner.reused
+        scanning += elapsed
+        for event in events:
+            if isinstance(event, Created) and event.path in waiting:
+                at, hot = waiting.pop(event.path)
+                latencies[hot].append(clock - at)
+        clock += scheduler.delay() if adaptive else FIXED_INTERVAL
+    return {'ticks': ticks, 'directories': directories, 'scanning': scanning, 'missed': len(waiting),
+            'hot': latencies[True], 'cold': latencies[False]}
+
+def summary(latencies):
+    if not latencies:
+        return f"{'-':>8}{'-':>8}{'-':>8}"
+    latencies = sorted(latencies)
+    return (f"{statistics.mean(latencies):>8.1f}{latencies[len(latencies) // 2]:>8.1f}"
+            f"{latencies[-1]:>8.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--areas', type=int, default=10)
+    parser.add_argument('--subtrees', type=int, default=20, help="subtrees per area")
+    parser.add_argument('--directories', type=int, default=50, help="directories per subtree")
+    parser.add_argument('--files', type=int, default=4, help="files per directory")
+    parser.add_argument('--hot', type=int, default=5, help="subtrees with frequent changes")
+    parser.add_argument('--hot-period', type=float, default=10, help="mean seconds between changes in a hot subtree")
+    parser.add_argument('--cold-period', type=float, default=120, help="mean seconds between changes anywhere cold")
+    parser.add_argument('--duration', type=float, default=1800, help="simulated seconds")
+    parser.add_argument('--budget', type=float, default=0.1)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--base', default='/dev/shm' if os.path.isdir('/dev/shm') else None)
+    args = parser.parse_args()
+
+    header = (f"{'schedule':<10}{'ticks':>7}{'dirs stat()ed':>15}{'scan s':>9}{'missed':>8}"
+              f"{'hot mean':>10}{'p50':>8}{'max':>8}{'cold mean':>10}{'p50':>8}{'max':>8}")
+    print(header)
+    print('-' * len(header))
+    for adaptive in (False, True):
+        root_dir = tempfile.mkdtemp(prefix='bench_schedule_', dir=args.base)
+        try:
+            subtrees = build_subtrees(root_dir, args.areas, args.subtrees, args.directories, args.files)
+            age_tree(root_dir)
+            timeline = make_timeline(subtrees, args.hot, args.hot_period, args.cold_period, args.duration, args.seed)
+            result = simulate(root_dir, timeline, args.duration, adaptive, args.budget)
+        finally:
+            shutil.rmtree(root_dir, ignore_errors=True)
+        print(f"{'adaptive' if adaptive else 'fixed 5s':<10}{result['ticks']:>7}{result['directories']:>15}"
+              f"{result['scanning']:>9.2f}{result['missed']:>8}  {summary(result['hot'])}  {summary(result['cold'])}")
+
+if __name__ == "__main__":
+    main()
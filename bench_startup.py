@@ -0,0 +1,129 @@
+"""
+Benchmark for daemon startup time and idle memory
+1) starts the monitors in an empty directory, either as the old main.py chain of processes or as daemon.py
+2) times how long it takes until both phase1 and phase2 report that they are monitoring
+3) waits for the process tree to go idle and sums its resident memory (Linux, from /proc)
+4) stops it with SIGTERM and times the shutdown
+"""
+
+import argparse
+import os
+import shutil
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# main.py before the daemon: a Process per phase, each running the phase's script in a new interpreter
+LEGACY_MAIN = f"""
+import subprocess, sys, time
+from multiprocessing import Process
+
+def run(script):
+    subprocess.run([sys.executable, script])
+
+if __name__ == "__main__":
+    processes = [Process(target=run, args=({os.path.join(REPO_DIR, 'phase1.py')!r},)),
+                 Process(target=run, args=({os.path.join(REPO_DIR, 'phase2.py')!r},))]
+    for process in processes:
+        process.start()
+    while any(process.is_alive() for process in processes):
+        time.sleep(1)
+"""
+
+COMMANDS = {
+    'legacy': [sys.executable, '-c', LEGACY_MAIN],
+    'daemon': [sys.executable, os.path.join(REPO_DIR, 'daemon.py')],
+}
+
+# Lines that say phase1 and phase2 are up, printed by phase1.monitor_root() and phase2.monitor_images()
+READY_MARKERS = ("Monitoring directory:", "directory watches")
+
+def process_tree(pid):
+    """Return the pids of pid and all of its descendants."""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # The command name may contain spaces, the fields after it do not
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    tree = [pid]
+    for parent in tree:
+        tree.extend(children.get(parent, []))
+    return tree
+
+def rss_bytes(pid):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+def run_once(mode, settle, timeout):
+    work_dir = tempfile.mkdtemp(prefix='bench_startup_')
+    env = dict(os.environ, PYTHONUNBUFFERED='1', PYTHONPATH=os.pathsep.join(filter(None, [REPO_DIR, os.environ.get('PYTHONPATH')])))
+    start = time.perf_counter()
+    process = subprocess.Popen(COMMANDS[mode], cwd=work_dir, env=env, stdout=subprocess.PIPE,
+                               stderr=subprocess.STDOUT, text=True, start_new_session=True)
+    seen = set()
+    ready = threading.Event()
+    def read_output():
+        for line in process.stdout:
+            seen.update(marker for marker in READY_MARKERS if marker in line)
+            if len(seen) == len(READY_MARKERS):
+                ready.set()
+    reader = threading.Thread(target=read_output, daemon=True)
+    reader.start()
+    try:
+        if not ready.wait(timeout):
+            raise RuntimeError(f"{mode} did not report ready within {timeout}s")
+        startup = time.perf_counter() - start
+        time.sleep(settle)
+        pids = process_tree(process.pid)
+        rss = sum(rss_bytes(pid) for pid in pids)
+        stopping = time.perf_counter()
+        if mode == 'daemon':
+            process.send_signal(signal.SIGTERM)
+        else:
+            # The old chain has no shutdown path of its own
+            os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout)
+        shutdown = time.perf_counter() - stopping
+        return {'startup': startup, 'rss': rss, 'processes': len(pids), 'shutdown': shutdown}
+    finally:
+        if process.poll() is None:
+            os.killpg(process.pid, signal.SIGKILL)
+            process.wait()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', nargs='+', default=list(COMMANDS), choices=list(COMMANDS))
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--settle', type=float, default=2.0, help="seconds to wait after startup before measuring RSS")
+    parser.add_argument('--timeout', type=float, default=60)
+    args = parser.parse_args()
+
+    print(f"{'mode':<10}{'startup s':>12}{'processes':>11}{'idle RSS MB':>14}{'shutdown s':>12}")
+    for mode in args.modes:
+        runs = [run_once(mode, args.settle, args.timeout) for _ in range(args.runs)]
+        print(f"{mode:<10}{statistics.median(run['startup'] for run in runs):>12.3f}"
+              f"{runs[-1]['processes']:>11}"
+              f"{statistics.median(run['rss'] for run in runs) / 2**20:>14.1f}"
+              f"{statistics.median(run['shutdown'] for run in runs):>12.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Per-path event coalescing
+1) collects the events of a path until it has been quiet for a short window, then runs one callback for the burst
+2) runs a path straight away on flush(), used for close-write events, which mark the end of a write
+3) calls back on its own thread, so the watchdog observer thread never hashes a file
+4) counts events received against callbacks run, so the saving can be checked
+5) runs a path that never goes quiet (a file written a little at a time) at most max_delay after its first event
+"""
+
+import heapq
+import logging
+import threading
+import time
+
+class EventCoalescer:
+    """Run callback(path) once per burst of events for that path."""
+    def __init__(self, callback, quiet_window=0.05, max_delay=1.0):
+        self.callback = callback
+        self.quiet_window = quiet_window
+        self.max_delay = max_delay
+        # path -> deadline, and a heap of (deadline, path) with stale entries skipped on pop
+        self.deadlines = {}
+        # path -> time of the first event of its pending burst
+        self.first_events = {}
+        self.heap = []
+        self.condition = threading.Condition()
+        self.events_received = 0
+        self.callbacks = 0
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name="coalescer", daemon=True)
+        self.thread.start()
+
+    def touch(self, path):
+        """Record an event for path, postponing its callback until the window is quiet, or max_delay has passed."""
+        self.schedule(path, self.quiet_window)
+
+    def flush(self, path):
+        """Record an event for path and run its callback without waiting."""
+        self.schedule(path, 0)
+
+    def schedule(self, path, delay):
+        with self.condition:
+            self.events_received += 1
+            now = time.monotonic()
+            first_event = self.first_events.setdefault(path, now)
+            # Without the cap a steady trickle of writes would postpone the callback forever
+            deadline = min(now + delay, first_event + self.max_delay)
+            self.deadlines[path] = deadline
+            heapq.heappush(self.heap, (deadline, path))
+            # Only wake the thread if this deadline is now the earliest one
+            if self.heap[0][1] == path:
+                self.condition.notify()
+
+    def pending(self):
+        with self.condition:
+            return len(self.deadlines)
+
+    def run(self):
+        while True:
+            with self.condition:
+                path = self.next_due()
+                if path is None:
+                    return
+            try:
+                self.callback(path)
+            except Exception as e:
+                logging.warning(f"Could not process events for {path}: {e}")
+            self.callbacks += 1
+
+    def next_due(self):
+        """Wait for the next path whose window has expired; None once closed."""
+        while self.running:
+            if not self.heap:
+                self.condition.wait()
+                continue
+            deadline, path = self.heap[0]
+            if self.deadlines.get(path) != deadline:
+                # Superseded by a later event for the same path
+                heapq.heappop(self.heap)
+                continue
+            delay = deadline - time.monotonic()
+            if delay > 0:
+                self.condition.wait(delay)
+                continue
+            heapq.heappop(self.heap)
+            del self.deadlines[path]
+            del self.first_events[path]
+            return path
+        return None
+
+    def close(self):
+        """Stop the thread; pending paths are dropped."""
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.thread.join()
@@ -0,0 +1,85 @@
+"""
+Honeypot daemon: phase1 and phase2 in one process
+1) opens one registry and shares it between the scanner/deployer (phase1) and the integrity watcher (phase2)
+2) runs each phase in a thread instead of a chain of interpreters, so PIL and the rest are imported once, if at all
+3) phase2 is woken by the registry as soon as phase1 commits new honeypots, instead of polling a file
+4) stops cleanly on Ctrl+C or SIGTERM: the watchers stop, queued deployments finish and the registry is written
+"""
+
+import logging
+import os
+import signal
+import threading
+from eventlog import setup_logging, stop_logging, log_event
+from registry import HoneypotRegistry
+
+class Daemon:
+    """Run phase1 and phase2 as threads around one shared registry."""
+    def __init__(self, root_dir=None, event_driven=True, roots=None):
+        self.root_dir = root_dir or os.getcwd()
+        self.event_driven = event_driven
+        # Directories phase1 deploys honeypots in, by default phase1.ROOTS or root_dir
+        self.roots = roots
+        self.stop = threading.Event()
+        self.registry = None
+        self.threads = []
+
+    def start(self):
+        # Imported here so a --help or a failed start costs nothing
+        import phase1
+        import phase2
+        # monitor.log and the registry live in the base directory, whatever directory the daemon was started from
+        os.chdir(self.root_dir)
+        setup_logging(console=phase1.LOG_CONSOLE)
+        self.registry = HoneypotRegistry()
+        self.registry.import_csv()
+        phase1.registry = self.registry
+        self.phase1 = phase1
+        self.threads = [
+            threading.Thread(target=self.guard, args=(phase1.monitor_directories, self.event_driven, self.stop, self.roots),
+                             name="phase1"),
+            threading.Thread(target=self.guard, args=(phase2.monitor_images_from_registry, self.registry, self.stop),
+                             name="phase2"),
+        ]
+        for thread in self.threads:
+            thread.start()
+        log_event('daemon_started', f"Daemon {os.getpid()} monitoring {self.root_dir}", pid=os.getpid())
+
+    def guard(self, target, *args):
+        """Run a phase, and stop the daemon if it ends on its own."""
+        try:
+            target(*args)
+        except Exception as e:
+            log_event('daemon_error', f"{threading.current_thread().name} failed: {e}", logging.ERROR, error=str(e))
+        finally:
+            self.stop.set()
+
+    def wait(self):
+        """Block until stopped by a signal, Ctrl+C or a phase ending."""
+        try:
+            while not self.stop.wait(1):
+                pass
+        except KeyboardInterrupt:
+            self.stop.set()
+
+    def shutdown(self):
+        self.stop.set()
+        for thread in self.threads:
+            thread.join()
+        self.phase1.shutdown()
+        self.registry.close()
+        log_event('daemon_stopped', "Daemon stopped")
+        stop_logging()
+
+def run(root_dir=None, event_driven=True, roots=None):
+    daemon = Daemon(root_dir, event_driven, roots)
+    # SIGTERM (e.g. from a service manager) stops the daemon like Ctrl+C
+    signal.signal(signal.SIGTERM, lambda signum, frame: daemon.stop.set())
+    daemon.start()
+    try:
+        daemon.wait()
+    finally:
+        daemon.shutdown()
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,90 @@
+"""
+Parallel honeypot deployment
+1) takes directories from the scanner through a bounded queue
+2) coalesces requests for a directory that is already queued or being deployed
+3) deploys honeypots with a pool of worker threads so a large burst drains while scanning continues
+4) applies backpressure: submit() blocks once the queue is full
+5) calls on_drained() whenever the queue empties, so a burst can be committed in one batch
+"""
+
+import logging
+import queue
+import threading
+
+class HoneypotDeployer:
+    """Run deploy(directory) on a pool of worker threads fed by a bounded queue."""
+    def __init__(self, deploy, workers=4, maxsize=10000, on_drained=None):
+        self.deploy = deploy
+        self.on_drained = on_drained
+        self.queue = queue.Queue(maxsize)
+        self.pending = set()
+        self.lock = threading.Lock()
+        self.submitted = 0
+        self.coalesced = 0
+        self.deployed = 0
+        self.failed = 0
+        self.threads = [threading.Thread(target=self.worker, name=f"deployer-{i}", daemon=True)
+                        for i in range(workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, directory, timeout=None):
+        """Queue a directory, returning False if it is already pending.
+
+        Blocks while the queue is full; raises queue.Full if `timeout` expires.
+        """
+        with self.lock:
+            if directory in self.pending:
+                self.coalesced += 1
+                return False
+            self.pending.add(directory)
+            self.submitted += 1
+        try:
+            self.queue.put(directory, timeout=timeout)
+        except queue.Full:
+            with self.lock:
+                self.pending.discard(directory)
+                self.submitted -= 1
+            raise
+        return True
+
+    def worker(self):
+        while True:
+            directory = self.queue.get()
+            if directory is None:
+                self.queue.task_done()
+                return
+            try:
+                self.deploy(directory)
+                self.deployed += 1
+            except OSError as e:
+                # Usually the directory was removed before its turn came
+                self.failed += 1
+                logging.warning(f"Could not deploy honeypot in {directory}: {e}")
+            except Exception:
+                # Anything else is a bug, but one bad directory must not take a worker down with it
+                self.failed += 1
+                logging.exception(f"Failed to deploy honeypot in {directory}")
+            finally:
+                with self.lock:
+                    self.pending.discard(directory)
+                    drained = not self.pending
+                if drained and self.on_drained is not None:
+                    self.on_drained()
+                self.queue.task_done()
+
+    def backlog(self):
+        """Return the number of directories queued or being deployed."""
+        with self.lock:
+            return len(self.pending)
+
+    def join(self):
+        """Wait until every queued directory has been deployed."""
+        self.queue.join()
+
+    def close(self):
+        """Drain the queue and stop the worker threads."""
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
@@ -0,0 +1,71 @@
+"""
+Digest algorithms for honeypot integrity checks
+1) sha256 and blake2b from hashlib are always available
+2) xxh3_128/xxh64 (xxhash) and blake3 are registered when those packages are installed
+3) hash_file() streams a file through any registered algorithm in fixed-size chunks
+4) the algorithm is stored per honeypot in the registry, so baselines stay valid when the default changes
+"""
+
+import hashlib
+import os
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+try:
+    import blake3
+except ImportError:
+    blake3 = None
+
+# Bytes read at a time while hashing, so memory does not grow with the file size
+HASH_CHUNK_SIZE = 64 * 1024
+
+ALGORITHMS = {
+    'sha256': hashlib.sha256,
+    'blake2b': hashlib.blake2b,
+}
+if xxhash is not None:
+    ALGORITHMS['xxh3_128'] = xxhash.xxh3_128
+    ALGORITHMS['xxh64'] = xxhash.xxh64
+if blake3 is not None:
+    ALGORITHMS['blake3'] = blake3.blake3
+
+# Change detection does not need a cryptographic digest on the hot path. Without xxhash or blake3, sha256 is the
+# fastest hashlib digest on CPUs with SHA extensions (most x86 since 2017, ARMv8), where OpenSSL runs it at
+# about twice blake2b's speed
+DEFAULT_ALGORITHM = next(algorithm for algorithm in ('xxh3_128', 'blake3', 'sha256') if algorithm in ALGORITHMS)
+
+def available_algorithms():
+    return sorted(ALGORITHMS)
+
+def new_hasher(algorithm=DEFAULT_ALGORITHM):
+    """Return a new hash object for a registered algorithm."""
+    try:
+        return ALGORITHMS[algorithm]()
+    except KeyError:
+        raise ValueError(f"Unknown or unavailable digest algorithm: {algorithm}") from None
+
+def hash_bytes(data, algorithm=DEFAULT_ALGORITHM):
+    hasher = new_hasher(algorithm)
+    hasher.update(data)
+    return hasher.hexdigest()
+
+def hash_file(path, algorithm=DEFAULT_ALGORITHM):
+    """Hash a file in one streaming pass and return (hex digest, os.stat_result).
+
+    The stat is taken from the open file before it is read, so a write racing
+    with the hash also changes the stat.
+    """
+    hasher = new_hasher(algorithm)
+    buffer = bytearray(HASH_CHUNK_SIZE)
+    view = memoryview(buffer)
+    with open(path, 'rb', buffering=0) as f:
+        st = os.fstat(f.fileno())
+        while True:
+            size = f.readinto(buffer)
+            if not size:
+                break
+            hasher.update(view[:size])
+    return hasher.hexdigest(), st
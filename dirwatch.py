@@ -0,0 +1,137 @@
+"""
+Watching many directories with one watcher
+1) watches each directory on its own, not recursively, so the watches grow with the directories asked for and
+   nothing below them (node_modules, .git) is watched by accident
+2) on Linux puts every directory on one inotify instance read by one thread; a watchdog Observer opens an instance
+   and starts threads per watch, and there are only 128 instances per user by default against tens of thousands
+   of watches (fs.inotify.max_user_instances and max_user_watches)
+3) hands the events to a watchdog FileSystemEventHandler as file events, pairing the two halves of a rename
+4) elsewhere falls back to a watchdog Observer with one watch per directory
+"""
+
+import os
+from threading import Lock, Thread
+from watchdog.events import (FileClosedEvent, FileCreatedEvent, FileDeletedEvent, FileModifiedEvent,
+                             FileMovedEvent)
+from watchdog.observers import Observer
+
+try:
+    from watchdog.observers.inotify_c import Inotify, InotifyConstants, inotify_rm_watch
+except Exception:
+    # Not Linux, or a libc without inotify
+    Inotify = None
+
+if Inotify is not None:
+    EVENT_MASK = (InotifyConstants.IN_MODIFY | InotifyConstants.IN_ATTRIB | InotifyConstants.IN_CLOSE_WRITE
+                  | InotifyConstants.IN_MOVED_FROM | InotifyConstants.IN_MOVED_TO | InotifyConstants.IN_CREATE
+                  | InotifyConstants.IN_DELETE)
+
+    class SharedInotify(Inotify):
+        def remove_watch(self, path):
+            # watchdog forgets the watch descriptor here, then read_events() fails with a KeyError on the
+            # IN_IGNORED event the kernel queues for it. Leave the bookkeeping to that event instead.
+            with self._lock:
+                if inotify_rm_watch(self._inotify_fd, self._wd_for_path[path]) == -1:
+                    Inotify._raise_error()
+
+class DirectoryWatcher:
+    """Watch directories (not recursively) and dispatch the events for their files to one handler."""
+    def __init__(self, event_handler):
+        self.event_handler = event_handler
+        self.observer = Observer() if Inotify is None else None
+        self.inotify = None
+        self.thread = None
+        # directory -> watchdog watch (or None on the shared inotify instance)
+        self.watches = {}
+        # The first half of a rename, (cookie, path), until the second half comes
+        self.move = None
+        self.running = False
+        self.lock = Lock()
+
+    def start(self):
+        self.running = True
+        if self.observer is not None:
+            self.observer.start()
+
+    def add(self, directory):
+        """Watch a directory; raises OSError if it is gone or inotify is out of watches."""
+        with self.lock:
+            if directory in self.watches:
+                return
+            if self.observer is not None:
+                self.watches[directory] = self.observer.schedule(self.event_handler, directory, recursive=False)
+                return
+            if self.inotify is None:
+                self.inotify = SharedInotify(os.fsencode(directory), event_mask=EVENT_MASK)
+                self.thread = Thread(target=self.run, name="dirwatch", daemon=True)
+                self.thread.start()
+            else:
+                self.inotify.add_watch(os.fsencode(directory))
+            self.watches[directory] = None
+
+    def remove(self, directory):
+        with self.lock:
+            if directory not in self.watches:
+                return
+            watch = self.watches.pop(directory)
+            try:
+                if self.observer is not None:
+                    self.observer.unschedule(watch)
+                else:
+                    self.inotify.remove_watch(os.fsencode(directory))
+            except (KeyError, OSError):
+                # The watch went with the directory
+                pass
+
+    def watch_count(self):
+        return len(self.watches)
+
+    def run(self):
+        while self.running:
+            # Blocks until there are events, returns nothing once stop() closes the instance
+            for event in self.inotify.read_events():
+                self.dispatch(event)
+            if self.move is not None:
+                # The kernel queues the two halves of a rename together, so this one left the watched directories
+                self.event_handler.dispatch(FileDeletedEvent(self.move[1]))
+                self.move = None
+
+    def dispatch(self, event):
+        # Directories are only watched for the files in them
+        if event.is_directory or event.is_ignored:
+            return
+        path = os.fsdecode(event.src_path)
+        move, self.move = self.move, None
+        if event.is_moved_to and move is not None and move[0] == event.cookie:
+            self.event_handler.dispatch(FileMovedEvent(move[1], path))
+            return
+        if move is not None:
+            # Renamed out of the watched directories
+            self.event_handler.dispatch(FileDeletedEvent(move[1]))
+        if event.is_moved_from:
+            # The second half, if any, comes next
+            self.move = (event.cookie, path)
+        elif event.is_moved_to:
+            # Renamed in from an unwatched directory, over whatever was there
+            self.event_handler.dispatch(FileModifiedEvent(path))
+        elif event.is_close_write:
+            self.event_handler.dispatch(FileClosedEvent(path))
+        elif event.is_modify or event.is_attrib:
+            self.event_handler.dispatch(FileModifiedEvent(path))
+        elif event.is_create:
+            self.event_handler.dispatch(FileCreatedEvent(path))
+        elif event.is_delete:
+            self.event_handler.dispatch(FileDeletedEvent(path))
+
+    def stop(self):
+        self.running = False
+        if self.observer is not None:
+            self.observer.stop()
+        elif self.inotify is not None:
+            self.inotify.close()
+
+    def join(self):
+        if self.observer is not None:
+            self.observer.join()
+        elif self.thread is not None:
+            self.thread.join()
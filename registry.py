@@ -0,0 +1,252 @@
+"""
+Honeypot registry shared by phase1 and phase2
+1) stores one row per honeypot in an SQLite database in WAL mode, replacing file_info.csv
+2) indexes rows by path, by directory and by (device, inode) so every update and lookup is O(log n)
+   and removing a whole directory subtree is one index range delete, O(log n + k)
+3) buffers inserts and writes them in batches, one transaction per batch
+4) imports an existing file_info.csv once
+5) keeps a change log (filled by triggers) that phase2 tails from a saved offset to follow the registry live
+6) records the digest algorithm and deploy-time digest of each honeypot
+7) calls in-process subscribers after every write, so a watcher in the same process need not poll the change log
+8) keeps a hash cache keyed by each file's stat fingerprint, so phase2 re-hashes only the honeypots that changed since it last ran
+"""
+
+import csv
+import os
+import sqlite3
+import threading
+import time
+
+REGISTRY_FILE = "file_info.db"
+CSV_FILE = "file_info.csv"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS honeypots (
+    id INTEGER PRIMARY KEY,
+    file_name TEXT NOT NULL,
+    extension TEXT NOT NULL,
+    directory TEXT NOT NULL,
+    path TEXT NOT NULL UNIQUE,
+    device INTEGER,
+    inode INTEGER,
+    created REAL,
+    algorithm TEXT,
+    digest TEXT
+);
+CREATE INDEX IF NOT EXISTS honeypots_directory ON honeypots (directory);
+CREATE INDEX IF NOT EXISTS honeypots_inode ON honeypots (device, inode);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    operation TEXT NOT NULL,
+    path TEXT NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS honeypots_added AFTER INSERT ON honeypots BEGIN
+    INSERT INTO changes (operation, path) VALUES ('add', NEW.path);
+END;
+CREATE TRIGGER IF NOT EXISTS honeypots_removed AFTER DELETE ON honeypots BEGIN
+    INSERT INTO changes (operation, path) VALUES ('remove', OLD.path);
+END;
+CREATE TABLE IF NOT EXISTS hash_cache (
+    device INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    ctime_ns INTEGER NOT NULL,
+    algorithm TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    PRIMARY KEY (device, inode, algorithm)
+);
+"""
+
+# Columns added after the first release, created on older databases when they are opened
+MIGRATIONS = {
+    'algorithm': "ALTER TABLE honeypots ADD COLUMN algorithm TEXT",
+    'digest': "ALTER TABLE honeypots ADD COLUMN digest TEXT",
+}
+
+INSERT_SQL = ("INSERT OR REPLACE INTO honeypots"
+              " (file_name, extension, directory, path, device, inode, created, algorithm, digest)"
+              " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)")
+
+class HoneypotRegistry:
+    """An indexed, thread-safe registry of deployed honeypots."""
+    def __init__(self, db_file=REGISTRY_FILE, batch_size=500, flush_interval=1.0):
+        self.db_file = db_file
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.pending = []
+        self.subscribers = []
+        self.last_flush = time.monotonic()
+        self.lock = threading.RLock()
+        # One connection shared by all threads, serialised by self.lock
+        self.connection = sqlite3.connect(db_file, check_same_thread=False, timeout=30)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        with self.connection:
+            self.connection.executescript(SCHEMA)
+            columns = {row['name'] for row in self.connection.execute("PRAGMA table_info(honeypots)")}
+            for column, statement in MIGRATIONS.items():
+                if column not in columns:
+                    self.connection.execute(statement)
+
+    def add(self, file_name, extension, directory, device=None, inode=None, algorithm=None, digest=None):
+        """Buffer a honeypot row, writing the batch once it is full or old enough."""
+        with self.lock:
+            self.pending.append((file_name, extension, directory, os.path.join(directory, file_name + extension),
+                                 device, inode, time.time(), algorithm, digest))
+            if len(self.pending) >= self.batch_size or time.monotonic() - self.last_flush >= self.flush_interval:
+                self.flush()
+
+    def add_many(self, rows):
+        """Insert (file_name, extension, directory, device, inode, algorithm, digest) rows in one transaction."""
+        with self.lock:
+            self.pending.extend((file_name, extension, directory, os.path.join(directory, file_name + extension),
+                                 device, inode, time.time(), algorithm, digest)
+                                for file_name, extension, directory, device, inode, algorithm, digest in rows)
+            self.flush()
+
+    def flush(self):
+        """Write the buffered rows."""
+        with self.lock:
+            self.last_flush = time.monotonic()
+            if not self.pending:
+                return
+            with self.connection:
+                self.connection.executemany(INSERT_SQL, self.pending)
+            self.pending = []
+        self.publish()
+
+    def subscribe(self, callback):
+        """Call callback() after every committed write; it must return quickly."""
+        self.subscribers.append(callback)
+
+    def publish(self):
+        for callback in self.subscribers:
+            callback()
+
+    def remove_directories(self, directories):
+        """Remove the honeypots registered in any of the given directories."""
+        with self.lock:
+            self.flush()
+            with self.connection:
+                self.connection.executemany("DELETE FROM honeypots WHERE directory = ?",
+                                            ((directory,) for directory in directories))
+        self.publish()
+
+    def remove_subtrees(self, directories):
+        """Remove the honeypots in each directory and everywhere below it."""
+        with self.lock:
+            self.flush()
+            with self.connection:
+                for directory in directories:
+                    directory = directory.rstrip(os.sep) or os.sep
+                    prefix = directory if directory.endswith(os.sep) else directory + os.sep
+                    # Every path below the directory sorts between "dir/" and "dir" + chr(ord("/") + 1)
+                    self.connection.execute("DELETE FROM honeypots WHERE directory = ?", (directory,))
+                    self.connection.execute("DELETE FROM honeypots WHERE directory >= ? AND directory < ?",
+                                            (prefix, prefix[:-1] + chr(ord(os.sep) + 1)))
+        self.publish()
+
+    def remove_path(self, path):
+        with self.lock:
+            self.flush()
+            with self.connection:
+                self.connection.execute("DELETE FROM honeypots WHERE path = ?", (path,))
+        self.publish()
+
+    def find_by_path(self, path):
+        with self.lock:
+            self.flush()
+            return self.connection.execute("SELECT * FROM honeypots WHERE path = ?", (path,)).fetchone()
+
+    def find_by_inode(self, device, inode):
+        with self.lock:
+            self.flush()
+            return self.connection.execute("SELECT * FROM honeypots WHERE device = ? AND inode = ?",
+                                           (device, inode)).fetchone()
+
+    def find_by_directory(self, directory):
+        with self.lock:
+            self.flush()
+            return self.connection.execute("SELECT * FROM honeypots WHERE directory = ?", (directory,)).fetchall()
+
+    def honeypots(self):
+        """Return every registered honeypot."""
+        with self.lock:
+            self.flush()
+            return self.connection.execute("SELECT * FROM honeypots ORDER BY id").fetchall()
+
+    def count(self):
+        with self.lock:
+            self.flush()
+            return self.connection.execute("SELECT COUNT(*) FROM honeypots").fetchone()[0]
+
+    def last_change(self):
+        """Return the sequence number of the latest change, 0 if there is none."""
+        with self.lock:
+            self.flush()
+            return self.connection.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+
+    def changes_since(self, seq, limit=10000):
+        """Return up to `limit` (seq, operation, path) changes made after `seq`, oldest first."""
+        with self.lock:
+            self.flush()
+            return self.connection.execute("SELECT seq, operation, path FROM changes WHERE seq > ? ORDER BY seq LIMIT ?",
+                                           (seq, limit)).fetchall()
+
+    def prune_changes(self, seq):
+        """Forget the changes up to and including `seq`."""
+        with self.lock:
+            with self.connection:
+                self.connection.execute("DELETE FROM changes WHERE seq <= ?", (seq,))
+
+    def cached_digests(self):
+        """Return {(device, inode, size, mtime_ns, ctime_ns, algorithm): digest} for every cached file."""
+        with self.lock:
+            return {tuple(row[:6]): row[6] for row in self.connection.execute(
+                "SELECT device, inode, size, mtime_ns, ctime_ns, algorithm, digest FROM hash_cache")}
+
+    def replace_cached_digests(self, rows):
+        """Replace the hash cache with (device, inode, size, mtime_ns, ctime_ns, algorithm, digest) rows."""
+        with self.lock:
+            with self.connection:
+                # Entries of removed or changed files are dropped rather than left to pile up
+                self.connection.execute("DELETE FROM hash_cache")
+                self.connection.executemany("INSERT OR REPLACE INTO hash_cache VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def import_csv(self, csv_file=CSV_FILE):
+        """Import an existing file_info.csv once; return the number of rows imported."""
+        if not os.path.exists(csv_file):
+            return 0
+        with self.lock:
+            self.flush()
+            # BEGIN IMMEDIATE so phase1 and phase2 starting together import it only once
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                done = self.connection.execute("SELECT value FROM meta WHERE key = 'csv_imported'").fetchone()
+                rows = []
+                if done is None:
+                    with open(csv_file, mode='r', newline='') as file:
+                        for row in csv.reader(file):
+                            if len(row) == 3:
+                                file_name, extension, directory = row
+                                rows.append((file_name, extension, directory, os.path.join(directory, file_name + extension),
+                                             None, None, time.time(), None, None))
+                    self.connection.executemany(INSERT_SQL, rows)
+                    self.connection.execute("INSERT INTO meta (key, value) VALUES ('csv_imported', ?)",
+                                            (os.path.abspath(csv_file),))
+                self.connection.execute("COMMIT")
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+        return len(rows)
+
+    def close(self):
+        with self.lock:
+            self.flush()
+            self.connection.close()
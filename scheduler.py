@@ -0,0 +1,117 @@
+"""
+Adaptive scan scheduling for phase1's polling loop
+1) splits the tree into subtrees, the directories SUBTREE_DEPTH levels below the root, and gives each a scan interval
+2) a subtree that changed in the last HOT_PERIOD seconds is hot and is scanned on every tick; after that each scan
+   that finds it unchanged doubles its interval, up to MAX_INTERVAL for cold, archival data
+3) a subtree that is not due is trusted: the scanner copies it from the last snapshot without a stat, while the
+   directories above the subtrees are scanned every tick, so new subtrees are seen at once
+4) keeps the scanner within a duty cycle: after a tick that took t seconds the loop sleeps at least t * (1 - BUDGET) / BUDGET,
+   and cold subtrees that fall due together are spread over several ticks rather than scanned in one long tick
+5) tracks each subtree's scan cost (directories stat'ed) and changes, to estimate what a tick will cost
+"""
+
+import os
+import time
+
+SUBTREE_DEPTH = 2
+
+# Seconds between ticks, which is how often hot subtrees are scanned, and the longest a cold subtree goes unscanned
+MIN_INTERVAL = 1.0
+MAX_INTERVAL = 120.0
+
+# Activity comes in bursts, so a subtree stays hot for this long after its last change
+HOT_PERIOD = 60.0
+
+# Share of the time the scanner may spend scanning
+BUDGET = 0.1
+
+class Subtree:
+    """Scheduling state of one subtree."""
+    __slots__ = ('interval', 'due', 'cost', 'scans', 'changes', 'last_change')
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.due = 0.0
+        self.cost = 0
+        self.scans = 0
+        self.changes = 0
+        self.last_change = None
+
+class ScanScheduler:
+    """Decide which subtrees each scan looks at, from how often they change and what they cost."""
+    def __init__(self, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL, hot_period=HOT_PERIOD, budget=BUDGET,
+                 depth=SUBTREE_DEPTH):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.hot_period = hot_period
+        self.budget = budget
+        self.depth = depth
+        self.subtrees = {}
+        # Seconds per directory stat'ed, measured from the ticks
+        self.directory_time = None
+        self.elapsed = 0.0
+
+    def trusted(self, now=None):
+        """Return the subtrees the next scan may copy from the last snapshot."""
+        now = time.monotonic() if now is None else now
+        trusted = {path for path, state in self.subtrees.items() if state.due > now}
+        if self.directory_time is None:
+            return trusted
+        # Hot subtrees always go, then cold ones, longest overdue first, while the tick stays within its share
+        # of the interval; at least one cold subtree goes each tick, so none is put off for ever
+        due = sorted((state.interval > self.min_interval, state.due, path)
+                     for path, state in self.subtrees.items() if state.due <= now)
+        allowance = self.budget * self.min_interval / self.directory_time
+        cold_admitted = False
+        for cold, _, path in due:
+            cost = self.subtrees[path].cost
+            if cold:
+                if cost > allowance and cold_admitted:
+                    trusted.add(path)
+                    continue
+                cold_admitted = True
+            allowance -= cost
+        return trusted
+
+    def record(self, scanner, events, elapsed, now=None):
+        """Update the subtrees after a scan that took `elapsed` seconds and produced `events`."""
+        now = time.monotonic() if now is None else now
+        self.elapsed = elapsed
+        visited = scanner.listed + scanner.reused
+        if visited:
+            self.directory_time = elapsed / visited
+        changes = {}
+        for event in events:
+            parts = event.path.split(os.sep)
+            if len(parts) >= self.depth:
+                subtree = os.path.join(*parts[:self.depth])
+                changes[subtree] = changes.get(subtree, 0) + 1
+        present = set(scanner.trusted_subtrees)
+        for path, cost in scanner.subtree_cost.items():
+            present.add(path)
+            state = self.subtrees.get(path)
+            if state is None:
+                state = self.subtrees[path] = Subtree(self.min_interval)
+            if changes.get(path):
+                state.interval = self.min_interval
+                state.changes += changes[path]
+                state.last_change = now
+            elif state.last_change is not None and now - state.last_change < self.hot_period:
+                state.interval = self.min_interval
+            elif state.scans:
+                state.interval = min(state.interval * 2, self.max_interval)
+            state.cost = cost
+            state.scans += 1
+            state.due = now + state.interval
+        # A subtree that was neither scanned nor trusted is gone
+        for path in set(self.subtrees) - present:
+            del self.subtrees[path]
+
+    def delay(self):
+        """Return the seconds to wait before the next tick."""
+        return max(self.min_interval, self.elapsed * (1 - self.budget) / self.budget)
+
+    def tiers(self):
+        """Return the number of hot and cold subtrees."""
+        hot = sum(1 for state in self.subtrees.values() if state.interval <= self.min_interval)
+        return hot, len(self.subtrees) - hot
@@ -0,0 +1,623 @@
+"""
+Incremental directory snapshots for the phase1 scanner
+1) lists directories with os.scandir instead of os.walk
+2) remembers the st_mtime_ns and inode of every directory it lists
+3) re-lists a directory only when its mtime or inode changed, but still recurses into its sub-directories
+4) stores each snapshot compactly: interned path components, a parent-id tree and array-backed
+   name/inode/size/mtime columns instead of dicts of Python lists
+5) still answers the phase1.get_directory_structure mapping interface
+6) diffs two snapshots in a single merge pass into typed Created/Deleted/Modified events, visiting only
+   the directories the scanner had to re-list; rewriting a file in place leaves its directory's mtime alone,
+   so Modified is best effort: it is only seen once something else makes the scanner re-list the directory
+7) skips the entries a PathMatcher excludes, so an excluded directory is never listed or descended into
+8) checkpoints a snapshot to disk as its raw columns plus a NUL-separated name block, and loads it back through mmap,
+   so a restarted scanner re-lists only the directories that changed while it was down
+9) ParallelScanner stats and lists directories on a thread pool, for mounts where each listing is a network round trip,
+   and assembles the results in the serial scan's order, so its snapshots are identical to IncrementalScanner's
+10) can be told to trust whole subtrees: they are copied from the previous snapshot without a single stat, which is
+    how scheduler.ScanScheduler leaves cold subtrees alone between their scans
+11) the name table only grows while scanning, so IncrementalScanner.compact() rebuilds it from the names still in
+    the tree once most of it is stale; phase1 does so whenever it checkpoints
+"""
+
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# A directory modified this close to the scan may change again within the same
+# mtime tick, so its listing is not trusted on the next scan
+RACY_WINDOW_NS = 2_000_000_000
+
+# Checkpoint layout: header, root path, the columns (each 8-byte aligned, native byte order), then the names
+CHECKPOINT_MAGIC = b'HPSNAP01'
+CHECKPOINT_HEADER = struct.Struct('<8sBxxxiqqq')
+CHECKPOINT_COLUMNS = ('parent', 'name', 'first_child', 'child_count', 'inode', 'size', 'mtime_ns', 'kind')
+
+# IncrementalScanner.compact() rebuilds the name table once it holds this many times the names still in the tree
+COMPACT_RATIO = 2
+
+# Threads used by ParallelScanner, and how many directories each may have queued ahead of the scan
+SCAN_WORKERS = 8
+SCAN_WINDOW_PER_WORKER = 16
+
+# Entry kinds
+FILE = 0
+DIRECTORY = 1
+# A symlinked directory, listed like a directory but never descended into (as os.walk does)
+LINK = 2
+
+Created = namedtuple('Created', 'path is_dir size mtime_ns')
+Deleted = namedtuple('Deleted', 'path is_dir size mtime_ns')
+Modified = namedtuple('Modified', 'path size size_delta mtime_ns mtime_delta_ns')
+
+class NameTable:
+    """Intern path components so each distinct name is stored only once."""
+    def __init__(self):
+        self.names = []
+        self.ids = {}
+
+    def intern(self, name):
+        name_id = self.ids.get(name)
+        if name_id is None:
+            name_id = len(self.names)
+            self.names.append(name)
+            self.ids[name] = name_id
+        return name_id
+
+    def memory_footprint(self):
+        return (sys.getsizeof(self.names) + sys.getsizeof(self.ids)
+                + sum(sys.getsizeof(name) for name in self.names))
+
+class CompactSnapshot:
+    """A directory tree stored as parallel arrays, one row per file or directory.
+
+    Row 0 is the root. The children of a directory are stored contiguously and
+    sorted by name, starting at first_child; child_count is -1 for a directory
+    that could not be listed.
+
+    A snapshot produced by IncrementalScanner also records which of its
+    directories were re-listed (`changed`, as (row, previous row) pairs) and
+    which snapshot it was built from (`base_generation`), so diff_snapshots()
+    can skip every directory that was reused unchanged.
+    """
+    def __init__(self, names, generation=0, base_generation=None):
+        self.names = names
+        self.generation = generation
+        self.base_generation = base_generation
+        self.changed = []
+        # Trusted subtrees copied as a whole: subtree -> (root row, first row, end row, directories)
+        self.subtree_ranges = {}
+        self.parent = array('i')
+        self.name = array('i')
+        self.kind = bytearray()
+        self.inode = array('Q')
+        self.size = array('q')
+        self.mtime_ns = array('q')
+        self.first_child = array('i')
+        self.child_count = array('i')
+
+    def __len__(self):
+        return len(self.parent)
+
+    def append(self, parent, name_id, kind, inode, size, mtime_ns):
+        self.parent.append(parent)
+        self.name.append(name_id)
+        self.kind.append(kind)
+        self.inode.append(inode)
+        self.size.append(size)
+        self.mtime_ns.append(mtime_ns)
+        self.first_child.append(0)
+        self.child_count.append(-1)
+        return len(self.parent) - 1
+
+    def copy_children(self, other, other_id, entry_id):
+        """Copy the children of `other_id` in another snapshot under `entry_id` in this one."""
+        start = other.first_child[other_id]
+        count = other.child_count[other_id]
+        end = start + count
+        self.first_child[entry_id] = len(self.parent)
+        self.child_count[entry_id] = count
+        self.parent.extend(array('i', [entry_id]) * count)
+        self.name.extend(other.name[start:end])
+        self.kind.extend(other.kind[start:end])
+        self.inode.extend(other.inode[start:end])
+        self.size.extend(other.size[start:end])
+        self.mtime_ns.extend(other.mtime_ns[start:end])
+        self.first_child.extend(array('i', [0]) * count)
+        self.child_count.extend(array('i', [-1]) * count)
+        return start
+
+    def copy_range(self, other, other_id, start, end, entry_id):
+        """Copy rows start:end of another snapshot, the subtree below `other_id`, under `entry_id` in this one."""
+        delta = len(self.parent) - start
+        count = other.child_count[other_id]
+        self.first_child[entry_id] = other.first_child[other_id] + delta
+        self.child_count[entry_id] = count
+        # The rows start with the directory's own children, as copy_subtree() lays them out
+        self.parent.extend(array('i', [entry_id]) * count)
+        self.parent.extend(shifted(other.parent, start + count, end, delta))
+        self.name.extend(other.name[start:end])
+        self.kind.extend(other.kind[start:end])
+        self.inode.extend(other.inode[start:end])
+        self.size.extend(other.size[start:end])
+        self.mtime_ns.extend(other.mtime_ns[start:end])
+        self.first_child.extend(shifted(other.first_child, start, end, delta))
+        self.child_count.extend(other.child_count[start:end])
+
+    def children(self, entry_id):
+        start = self.first_child[entry_id]
+        return range(start, start + max(self.child_count[entry_id], 0))
+
+    def path(self, entry_id):
+        """Return the path of an entry relative to the root ('.' for the root)."""
+        parts = []
+        while entry_id > 0:
+            parts.append(self.names.names[self.name[entry_id]])
+            entry_id = self.parent[entry_id]
+        return os.path.join(*reversed(parts)) if parts else '.'
+
+    def find(self, relative_path):
+        """Return the row of a relative path, or -1, using a binary search per component."""
+        entry_id = 0
+        if relative_path in ('', '.'):
+            return entry_id if len(self.parent) else -1
+        names = self.names.names
+        for part in os.path.normpath(relative_path).split(os.sep):
+            low = self.first_child[entry_id]
+            high = low + max(self.child_count[entry_id], 0)
+            while low < high:
+                middle = (low + high) // 2
+                if names[self.name[middle]] < part:
+                    low = middle + 1
+                else:
+                    high = middle
+            if low >= self.first_child[entry_id] + max(self.child_count[entry_id], 0) or names[self.name[low]] != part:
+                return -1
+            entry_id = low
+        return entry_id
+
+    def listing(self, entry_id):
+        """Return a directory's contents as get_directory_structure() does."""
+        names = self.names.names
+        directories = []
+        files = []
+        for child in self.children(entry_id):
+            if self.kind[child] == FILE:
+                files.append(names[self.name[child]])
+            else:
+                directories.append(names[self.name[child]])
+        return {'directories': directories, 'files': files}
+
+    def is_listed(self, entry_id):
+        return entry_id >= 0 and self.kind[entry_id] == DIRECTORY and self.child_count[entry_id] >= 0
+
+    # Mapping interface, compatible with phase1.get_directory_structure()
+    def __contains__(self, relative_path):
+        return self.is_listed(self.find(relative_path))
+
+    def __getitem__(self, relative_path):
+        entry_id = self.find(relative_path)
+        if not self.is_listed(entry_id):
+            raise KeyError(relative_path)
+        return self.listing(entry_id)
+
+    def items(self):
+        """Yield (relative path, listing) for every listed directory, breadth-first."""
+        if not len(self.parent):
+            return
+        names = self.names.names
+        pending = deque([(0, '.')])
+        while pending:
+            entry_id, relative_path = pending.popleft()
+            if not self.is_listed(entry_id):
+                continue
+            yield relative_path, self.listing(entry_id)
+            for child in self.children(entry_id):
+                if self.kind[child] == DIRECTORY:
+                    name = names[self.name[child]]
+                    pending.append((child, name if relative_path == '.' else os.path.join(relative_path, name)))
+
+    def memory_footprint(self):
+        """Return the bytes used by this snapshot's columns and by the shared name table."""
+        columns = sum(sys.getsizeof(column) for column in (
+            self.parent, self.name, self.kind, self.inode, self.size,
+            self.mtime_ns, self.first_child, self.child_count))
+        names = self.names.memory_footprint()
+        return {'entries': len(self.parent), 'columns': columns, 'names': names, 'total': columns + names}
+
+class IncrementalScanner:
+    """Scan a directory tree, re-listing only the directories whose mtime changed."""
+    def __init__(self, root_dir, matcher=None):
+        self.root_dir = root_dir
+        self.matcher = matcher
+        # Paths below the root are built with os.path.join(root_dir, ...), so slicing this off makes them relative
+        self.root_prefix = len(os.path.join(root_dir, ''))
+        self.names = NameTable()
+        self.snapshot = None
+        self.listed = 0
+        self.reused = 0
+        # Directories this many levels below the root start a subtree; set to count directories per subtree
+        # and to let scan() trust subtrees
+        self.subtree_depth = None
+        self.subtree_cost = {}
+        self.trusted_subtrees = []
+        self.skipped = 0
+
+    def resume(self, snapshot):
+        """Continue from a snapshot loaded from a checkpoint, as if it were the last scan."""
+        self.names = snapshot.names
+        self.snapshot = snapshot
+
+    def scan(self, trusted=()):
+        """Return a CompactSnapshot of the tree, reusing the previous one where possible.
+
+        Subtrees named in `trusted` (relative paths at subtree_depth) are copied
+        from the previous snapshot as they were, without looking at the disk.
+        """
+        scan_started_ns = time.time_ns()
+        old = self.snapshot
+        if old is None:
+            new = CompactSnapshot(self.names)
+        else:
+            new = CompactSnapshot(self.names, old.generation + 1, old.generation)
+        new.append(-1, self.names.intern(''), DIRECTORY, 0, 0, -1)
+        self.listed = 0
+        self.reused = 0
+        self.subtree_cost = {}
+        self.trusted_subtrees = []
+        self.skipped = 0
+        pending = deque([(0, self.root_dir, 0 if old is not None else -1, None)])
+        for entry_id, path, old_id, subtree, (st, entries) in self.probes(pending, old):
+            if subtree is not None:
+                self.subtree_cost[subtree] = self.subtree_cost.get(subtree, 0) + 1
+            if st is None:
+                # Vanished or unreadable, os.walk skips these as well
+                continue
+            new.inode[entry_id] = st.st_ino
+            # -1 never matches, so a racy directory is listed again next time
+            new.mtime_ns[entry_id] = st.st_mtime_ns if scan_started_ns - st.st_mtime_ns > RACY_WINDOW_NS else -1
+            if unchanged(old, old_id, st):
+                old_start = new.copy_children(old, old_id, entry_id)
+                self.reused += 1
+                for offset, child in enumerate(new.children(entry_id)):
+                    if new.kind[child] == DIRECTORY:
+                        self.descend(pending, new, old, child, os.path.join(path, self.names.names[new.name[child]]),
+                                     old_start + offset, subtree, trusted)
+                continue
+            if old_id >= 0:
+                new.changed.append((entry_id, old_id))
+            if entries is None:
+                continue
+            self.listed += 1
+            old_children = {}
+            if old_id >= 0 and old.child_count[old_id] >= 0:
+                old_children = {old.name[child]: child for child in old.children(old_id) if old.kind[child] == DIRECTORY}
+            new.first_child[entry_id] = len(new)
+            new.child_count[entry_id] = len(entries)
+            directories = []
+            for name, kind, inode, size, mtime_ns in entries:
+                name_id = self.names.intern(name)
+                child = new.append(entry_id, name_id, kind, inode, size, mtime_ns)
+                if kind == DIRECTORY:
+                    directories.append((child, name, name_id))
+            # Only once the whole listing is in, since a trusted subtree is copied in straight away
+            for child, name, name_id in directories:
+                self.descend(pending, new, old, child, os.path.join(path, name), old_children.get(name_id, -1),
+                             subtree, trusted)
+        self.snapshot = new
+        return new
+
+    def descend(self, pending, new, old, entry_id, path, old_id, subtree, trusted):
+        """Queue a sub-directory for scanning, or copy it from the old snapshot if it starts a trusted subtree."""
+        if subtree is None and self.subtree_depth is not None:
+            relative_path = path[self.root_prefix:]
+            if relative_path.count(os.sep) + 1 == self.subtree_depth:
+                subtree = relative_path
+                # The inode check catches a directory replaced under the same name
+                if (subtree in trusted and old_id >= 0 and old.child_count[old_id] >= 0
+                        and old.inode[old_id] == new.inode[entry_id]):
+                    self.trust(new, old, entry_id, old_id, subtree)
+                    return
+        pending.append((entry_id, path, old_id, subtree))
+
+    def trust(self, new, old, entry_id, old_id, subtree):
+        """Copy a trusted subtree from the old snapshot as it was."""
+        # As last stat'ed, so the next real scan compares against the same values
+        new.inode[entry_id] = old.inode[old_id]
+        new.mtime_ns[entry_id] = old.mtime_ns[old_id]
+        start = len(new)
+        copied = old.subtree_ranges.get(subtree)
+        if copied is not None and copied[0] == old_id:
+            # Copied whole last time too, so its rows are contiguous and go across in one slice per column
+            new.copy_range(old, old_id, copied[1], copied[2], entry_id)
+            directories = copied[3]
+        else:
+            directories = copy_subtree(new, old, old_id, entry_id)
+        new.subtree_ranges[subtree] = (entry_id, start, len(new), directories)
+        self.skipped += directories
+        self.trusted_subtrees.append(subtree)
+
+    def probes(self, pending, old):
+        """Yield (entry_id, path, old_id, subtree, probe result) for the directories in `pending`, which grows as they are yielded."""
+        while pending:
+            entry_id, path, old_id, subtree = pending.popleft()
+            yield entry_id, path, old_id, subtree, self.probe(entry_id, path, old, old_id)
+
+    def probe(self, entry_id, path, old, old_id):
+        """Stat a directory and list it unless the old snapshot's listing still holds; return (stat, entries)."""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None, None
+        if unchanged(old, old_id, st):
+            return st, None
+        try:
+            return st, list_directory(path, self.matcher, path[self.root_prefix:] if entry_id else '')
+        except OSError:
+            return st, None
+
+    def compact(self):
+        """Drop the names no longer in the tree from the name table; return the snapshot to scan on from.
+
+        Names are interned for good, so a tree whose files keep getting new names grows the table without
+        bound. Once COMPACT_RATIO times more names than the last snapshot uses have piled up, that snapshot
+        is copied onto a table of its own names, sharing every other column, and the next scan builds on the
+        copy. Diff the next scan against the returned snapshot to keep the fast path; older snapshots keep the
+        old table and still diff correctly, only in full.
+        """
+        snapshot = self.snapshot
+        if snapshot is None:
+            return None
+        live = sorted(set(snapshot.name))
+        if len(self.names.names) <= COMPACT_RATIO * len(live):
+            return snapshot
+        names = NameTable()
+        names.names = [self.names.names[name_id] for name_id in live]
+        names.ids = {name: name_id for name_id, name in enumerate(names.names)}
+        renumbered = array('i', bytes(4 * len(self.names.names)))
+        for name_id, old_id in enumerate(live):
+            renumbered[old_id] = name_id
+        compacted = CompactSnapshot(names, snapshot.generation, snapshot.base_generation)
+        compacted.changed = snapshot.changed
+        compacted.subtree_ranges = snapshot.subtree_ranges
+        # A snapshot is never changed once scanned, so the columns can be shared
+        for column in CHECKPOINT_COLUMNS:
+            setattr(compacted, column, getattr(snapshot, column))
+        compacted.name = array('i', map(renumbered.__getitem__, snapshot.name))
+        self.names = names
+        self.snapshot = compacted
+        return compacted
+
+    def close(self):
+        """Release the scanner's resources, the serial scanner has none."""
+
+class ParallelScanner(IncrementalScanner):
+    """An IncrementalScanner that stats and lists directories on a pool of threads.
+
+    Every directory is its own unit of work on the pool's shared queue, so an idle
+    worker takes the next one wherever it lies in the tree, however unbalanced.
+    Results are consumed in the serial scan's breadth-first order, which keeps
+    the snapshot layout identical, with at most `window` directories in flight.
+    """
+    def __init__(self, root_dir, matcher=None, workers=SCAN_WORKERS, window=None):
+        super().__init__(root_dir, matcher)
+        self.workers = workers
+        self.window = window or workers * SCAN_WINDOW_PER_WORKER
+        self.pool = None
+
+    def probes(self, pending, old):
+        if self.pool is None:
+            self.pool = ThreadPoolExecutor(self.workers, thread_name_prefix='scanner')
+        in_flight = deque()
+        try:
+            while pending or in_flight:
+                # Directories are discovered as their parents are consumed, so top up before each wait
+                while pending and len(in_flight) < self.window:
+                    entry_id, path, old_id, subtree = pending.popleft()
+                    in_flight.append((entry_id, path, old_id, subtree,
+                                      self.pool.submit(self.probe, entry_id, path, old, old_id)))
+                entry_id, path, old_id, subtree, future = in_flight.popleft()
+                yield entry_id, path, old_id, subtree, future.result()
+        finally:
+            for *_, future in in_flight:
+                future.cancel()
+
+    def close(self):
+        """Stop the worker threads."""
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+def shifted(column, start, end, delta):
+    """Return column[start:end] with delta added to every value, which must stay in the column's signed range."""
+    if end <= start:
+        return column[start:end]
+    if numpy is not None:
+        return array(column.typecode, (numpy.frombuffer(column, column.typecode)[start:end] + delta).tobytes())
+    # Without NumPy, add to all the values at once as one big integer of their bytes. Flipping the sign bits
+    # offsets every value to an unsigned v + delta that still fits its own bytes, so nothing carries into the next
+    count = end - start
+    size = column.itemsize
+    ones = int.from_bytes((1).to_bytes(size, sys.byteorder) * count, sys.byteorder)
+    signs = ones << (8 * size - 1)
+    values = int.from_bytes(column[start:end].tobytes(), sys.byteorder) ^ signs
+    values = (values + delta * ones) ^ signs
+    return array(column.typecode, values.to_bytes(count * size, sys.byteorder))
+
+def copy_subtree(new, old, old_id, entry_id):
+    """Copy everything below a directory from the old snapshot, its rows contiguous; return the directories copied."""
+    copied = 0
+    pending = [(entry_id, old_id)]
+    while pending:
+        entry_id, old_id = pending.pop()
+        copied += 1
+        if old.child_count[old_id] < 0:
+            continue
+        old_start = new.copy_children(old, old_id, entry_id)
+        for offset, child in enumerate(new.children(entry_id)):
+            if new.kind[child] == DIRECTORY:
+                pending.append((child, old_start + offset))
+    return copied
+
+def unchanged(old, old_id, st):
+    """Return True if the old snapshot listed this directory and its mtime and inode are the same."""
+    return (old_id >= 0 and old.child_count[old_id] >= 0 and old.mtime_ns[old_id] == st.st_mtime_ns
+            and old.inode[old_id] == st.st_ino)
+
+def diff_snapshots(old, new):
+    """Return the Created/Deleted/Modified events between two snapshots in one pass.
+
+    When `new` was scanned directly from `old` only the re-listed directories
+    are merged, otherwise the two trees are merged in lockstep from the root.
+    Modified is reported for files whose size or mtime changed in a directory
+    that was re-listed. Files are not stat'ed in the other directories, so a
+    file rewritten in place is missed until its directory is re-listed for
+    another reason; the honeypots themselves are watched by phase2.
+    """
+    events = []
+    if not len(old) or not len(new):
+        return events
+    if new.names is old.names and new.base_generation == old.generation:
+        for entry_id, old_id in new.changed:
+            merge_directory(old, old_id, new, entry_id, events, None)
+        return events
+    pending = [(0, 0)]
+    while pending:
+        old_id, entry_id = pending.pop()
+        merge_directory(old, old_id, new, entry_id, events, pending)
+    return events
+
+def merge_directory(old, old_id, new, entry_id, events, pending):
+    """Merge the sorted children of one directory present in both snapshots."""
+    old_names = old.names.names
+    new_names = new.names.names
+    old_children = old.children(old_id) if old.child_count[old_id] >= 0 else range(0)
+    new_children = new.children(entry_id) if new.child_count[entry_id] >= 0 else range(0)
+    i, old_end = old_children.start, old_children.stop
+    j, new_end = new_children.start, new_children.stop
+    while i < old_end or j < new_end:
+        old_name = old_names[old.name[i]] if i < old_end else None
+        new_name = new_names[new.name[j]] if j < new_end else None
+        if new_name is None or (old_name is not None and old_name < new_name):
+            emit_subtree(old, i, Deleted, events)
+            i += 1
+        elif old_name is None or new_name < old_name:
+            emit_subtree(new, j, Created, events)
+            j += 1
+        else:
+            old_kind, new_kind = old.kind[i], new.kind[j]
+            if old_kind != new_kind:
+                emit_subtree(old, i, Deleted, events)
+                emit_subtree(new, j, Created, events)
+            elif new_kind == FILE:
+                if old.size[i] != new.size[j] or old.mtime_ns[i] != new.mtime_ns[j]:
+                    events.append(Modified(new.path(j), new.size[j], new.size[j] - old.size[i],
+                                           new.mtime_ns[j], new.mtime_ns[j] - old.mtime_ns[i]))
+            elif new_kind == DIRECTORY and pending is not None:
+                pending.append((i, j))
+            i += 1
+            j += 1
+
+def emit_subtree(snapshot, entry_id, event_type, events):
+    """Emit an event for an entry and, for a directory, everything below it."""
+    pending = [entry_id]
+    while pending:
+        entry_id = pending.pop()
+        kind = snapshot.kind[entry_id]
+        events.append(event_type(snapshot.path(entry_id), kind != FILE,
+                                 snapshot.size[entry_id], snapshot.mtime_ns[entry_id]))
+        if kind == DIRECTORY:
+            pending.extend(reversed(snapshot.children(entry_id)))
+
+def align(offset):
+    return (offset + 7) & ~7
+
+def save_snapshot(snapshot, checkpoint_file, root_dir):
+    """Write a snapshot of root_dir to checkpoint_file, replacing it atomically."""
+    root = os.fsencode(os.path.abspath(root_dir))
+    names = b'\0'.join(os.fsencode(name) for name in snapshot.names.names)
+    temporary = checkpoint_file + '.tmp'
+    with open(temporary, 'wb') as f:
+        f.write(CHECKPOINT_HEADER.pack(CHECKPOINT_MAGIC, sys.byteorder == 'little', len(root),
+                                       snapshot.generation, len(snapshot), len(snapshot.names.names)))
+        f.write(root)
+        for column in CHECKPOINT_COLUMNS:
+            f.write(b'\0' * (align(f.tell()) - f.tell()))
+            f.write(bytes(getattr(snapshot, column)))
+        f.write(names)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, checkpoint_file)
+
+def load_snapshot(checkpoint_file, root_dir):
+    """Load a checkpoint of root_dir, or return None if there is none or it does not match."""
+    try:
+        with open(checkpoint_file, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            with memoryview(mapped) as view:
+                return read_snapshot(view, root_dir)
+    except (OSError, ValueError, struct.error):
+        # Missing, empty (mmap refuses those) or corrupt, start from a full scan instead
+        return None
+
+def read_snapshot(view, root_dir):
+    magic, little_endian, root_length, generation, entries, name_count = CHECKPOINT_HEADER.unpack_from(view)
+    if magic != CHECKPOINT_MAGIC or little_endian != (sys.byteorder == 'little'):
+        raise ValueError("not a snapshot checkpoint for this platform")
+    offset = CHECKPOINT_HEADER.size
+    if os.fsdecode(view[offset:offset + root_length].tobytes()) != os.path.abspath(root_dir):
+        raise ValueError("checkpoint of another directory")
+    offset += root_length
+    snapshot = CompactSnapshot(NameTable(), generation)
+    for column in CHECKPOINT_COLUMNS:
+        offset = align(offset)
+        if column == 'kind':
+            snapshot.kind = bytearray(view[offset:offset + entries])
+            if len(snapshot.kind) != entries:
+                raise ValueError("truncated checkpoint")
+            offset += entries
+            continue
+        values = getattr(snapshot, column)
+        values.frombytes(view[offset:offset + entries * values.itemsize])
+        if len(values) != entries:
+            raise ValueError("truncated checkpoint")
+        offset += entries * values.itemsize
+    names = [os.fsdecode(name) for name in view[offset:].tobytes().split(b'\0')]
+    if len(names) != name_count:
+        raise ValueError("truncated checkpoint")
+    snapshot.names.names = names
+    snapshot.names.ids = {name: name_id for name_id, name in enumerate(names)}
+    return snapshot
+
+def list_directory(path, matcher=None, relative_path=''):
+    """List one directory as sorted (name, kind, inode, size, mtime_ns) tuples, leaving out excluded entries."""
+    entries = []
+    with os.scandir(path) as iterator:
+        for entry in iterator:
+            # Decided from the name alone, before the entry is stat'ed
+            if matcher is not None and matcher.excluded(entry.name, relative_path):
+                continue
+            try:
+                if entry.is_dir():
+                    kind = LINK if entry.is_symlink() else DIRECTORY
+                    size, mtime_ns = 0, -1
+                else:
+                    kind = FILE
+                    st = entry.stat(follow_symlinks=False)
+                    size, mtime_ns = st.st_size, st.st_mtime_ns
+                inode = entry.inode()
+            except OSError:
+                # Removed while listing
+                continue
+            entries.append((entry.name, kind, inode, size, mtime_ns))
+    entries.sort()
+    return entries
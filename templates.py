@@ -0,0 +1,124 @@
+"""
+Pre-rendered honeypot images
+1) renders a small pool of honeypot JPEGs once with PIL, or loads them from the template directory
+2) deploys a honeypot by copying one of the templates instead of drawing and encoding a new image
+3) copies with a reflink (FICLONE) where the filesystem supports it, then copy_file_range, then a plain write
+4) knows the digest of every template, so a deployed honeypot's baseline needs no read-back
+"""
+
+import io
+import os
+import random
+from digests import hash_bytes
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'honeypot_templates')
+POOL_SIZE = 4
+
+# ioctl request to share the source file's extents with the destination (btrfs, XFS)
+FICLONE = 0x40049409
+
+def render_image(variant=0):
+    """Render one honeypot JPEG and return its bytes."""
+    # PIL is only needed when the template pool has to be rendered
+    from PIL import Image, ImageDraw
+    width, height = 200, 200
+    image = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(image)
+    # Shift the text a little so the templates do not all share one hash
+    draw.text((10 + variant, 10 + variant), "This is a secure image", fill="black")
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+class TemplateCache:
+    """A pool of honeypot images kept in memory and on disk, ready to be copied."""
+    def __init__(self, template_dir=TEMPLATE_DIR, pool_size=POOL_SIZE):
+        self.template_dir = template_dir
+        self.pool_size = pool_size
+        self.templates = []
+        self.digests = {}
+        self.can_clone = fcntl is not None
+        self.can_copy_range = hasattr(os, 'copy_file_range')
+        self.load()
+
+    def load(self):
+        """Load the templates from disk, rendering the pool first if there is none."""
+        os.makedirs(self.template_dir, exist_ok=True)
+        names = sorted(name for name in os.listdir(self.template_dir) if name.endswith('.jpg'))
+        if not names:
+            for variant in range(self.pool_size):
+                name = f"template_{variant}.jpg"
+                with open(os.path.join(self.template_dir, name), 'wb') as file:
+                    file.write(render_image(variant))
+                names.append(name)
+        for name in names:
+            path = os.path.join(self.template_dir, name)
+            with open(path, 'rb') as file:
+                data = file.read()
+            fd = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+            self.templates.append((fd, data))
+
+    def close(self):
+        for fd, _ in self.templates:
+            os.close(fd)
+        self.templates = []
+
+    def digest(self, index, algorithm):
+        """Return the digest of a template, computed once per algorithm."""
+        key = (index, algorithm)
+        if key not in self.digests:
+            self.digests[key] = hash_bytes(self.templates[index][1], algorithm)
+        return self.digests[key]
+
+    def choose(self):
+        """Return the index of a random template."""
+        return random.randrange(len(self.templates))
+
+    def deploy(self, file_path, index=None):
+        """Write a template to file_path and return the index of the template used."""
+        if index is None:
+            index = self.choose()
+        source_fd, data = self.templates[index]
+        fd = os.open(file_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0), 0o644)
+        try:
+            if not (self.clone(source_fd, fd) or self.copy_range(source_fd, fd, len(data))):
+                view = memoryview(data)
+                while view:
+                    view = view[os.write(fd, view):]
+        finally:
+            os.close(fd)
+        return index
+
+    def clone(self, source_fd, fd):
+        if not self.can_clone:
+            return False
+        try:
+            fcntl.ioctl(fd, FICLONE, source_fd)
+            return True
+        except OSError:
+            # Not supported by this filesystem (or across filesystems), stop trying
+            self.can_clone = False
+            return False
+
+    def copy_range(self, source_fd, fd, size):
+        if not self.can_copy_range:
+            return False
+        offset = 0
+        try:
+            while offset < size:
+                copied = os.copy_file_range(source_fd, fd, size - offset, offset, offset)
+                if copied == 0:
+                    break
+                offset += copied
+        except OSError:
+            self.can_copy_range = False
+        if offset == size:
+            return True
+        os.ftruncate(fd, 0)
+        return False